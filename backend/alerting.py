@@ -0,0 +1,135 @@
+"""Alert suppression: one open alert per driver and condition instead of one per ping."""
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+OPEN = "open"
+UPDATE = "update"
+REOPEN = "reopen"
+CLOSE = "close"
+
+
+class AlertPolicy(NamedTuple):
+    open_after: int = 2  # consecutive pings with the condition before an alert opens
+    close_after: int = 3  # consecutive pings without it before the alert closes
+    cooldown: float = 120  # seconds after closing during which a recurrence reopens the same alert
+    update_interval: float = 30  # minimum seconds between two writes of an open alert
+
+
+class AlertState:
+    __slots__ = ("alert_id", "is_open", "count", "unwritten", "hits", "misses",
+                 "first_seen", "last_seen", "last_written", "closed_at")
+
+    def __init__(self):
+        self.alert_id: Optional[str] = None
+        self.is_open = False
+        self.count = 0
+        self.unwritten = 0
+        self.hits = 0
+        self.misses = 0
+        self.first_seen: Optional[datetime] = None
+        self.last_seen: Optional[datetime] = None
+        self.last_written: Optional[datetime] = None
+        self.closed_at: Optional[datetime] = None
+
+
+class AlertSuppressor:
+    """Per driver, per condition state machine with open/close hysteresis.
+
+    `observe` is fed every ping with whether the condition holds and returns
+    the write the caller has to make, or None when the ping is absorbed:
+    OPEN inserts a new alert, UPDATE/REOPEN/CLOSE update the existing one with
+    its count and last_seen.
+    """
+
+    def __init__(self, policies: Dict[str, AlertPolicy], default: AlertPolicy = AlertPolicy()):
+        self.policies = policies
+        self.default = default
+        self.states: Dict[str, Dict[Tuple[str, str], AlertState]] = {}
+        self.opened = 0
+        self.reopened = 0
+        self.updated = 0
+        self.closed = 0
+        self.suppressed = 0
+
+    def policy(self, key: str) -> AlertPolicy:
+        return self.policies.get(key.split(':', 1)[0], self.default)
+
+    def observe(self, driver_id: str, delivery_id: str, key: str, active: bool,
+                now: Optional[datetime] = None) -> Optional[Tuple[str, AlertState]]:
+        now = now or datetime.utcnow()
+        driver_states = self.states.setdefault(driver_id, {})
+        state = driver_states.get((delivery_id, key))
+        if state is None:
+            if not active:
+                return None
+            state = driver_states[(delivery_id, key)] = AlertState()
+        policy = self.policy(key)
+
+        if not active:
+            state.hits = 0
+            if not state.is_open:
+                if state.alert_id is None or now - state.closed_at > timedelta(seconds=policy.cooldown):
+                    del driver_states[(delivery_id, key)]
+                return None
+            state.misses += 1
+            if state.misses < policy.close_after:
+                return None
+            state.is_open = False
+            state.closed_at = now
+            self.closed += 1
+            return self._written(CLOSE, state, now)
+
+        state.misses = 0
+        state.count += 1
+        state.unwritten += 1
+        state.last_seen = now
+        if state.is_open:
+            if now - state.last_written < timedelta(seconds=policy.update_interval):
+                self.suppressed += 1
+                return None
+            self.updated += 1
+            return self._written(UPDATE, state, now)
+
+        state.hits += 1
+        if state.hits < policy.open_after:
+            self.suppressed += 1
+            return None
+        state.is_open = True
+        state.hits = 0
+        if state.alert_id is not None and now - state.closed_at <= timedelta(seconds=policy.cooldown):
+            self.reopened += 1
+            return self._written(REOPEN, state, now)
+        state.count = state.unwritten
+        state.first_seen = now
+        self.opened += 1
+        return self._written(OPEN, state, now)
+
+    @staticmethod
+    def _written(action: str, state: AlertState, now: datetime) -> Tuple[str, AlertState]:
+        state.unwritten = 0
+        state.last_written = now
+        return action, state
+
+    def discard(self, alert_id: str):
+        """Drop the state behind a resolved alert so a persisting condition opens a new one"""
+        for states in self.states.values():
+            for k, state in list(states.items()):
+                if state.alert_id == alert_id:
+                    del states[k]
+                    return
+
+    def forget(self, driver_id: str) -> List[AlertState]:
+        """Drop a driver's state; returns the alerts that were still open"""
+        states = self.states.pop(driver_id, {})
+        return [s for s in states.values() if s.is_open and s.alert_id]
+
+    def stats(self) -> dict:
+        return {
+            "open": sum(s.is_open for states in self.states.values() for s in states.values()),
+            "tracked": sum(len(states) for states in self.states.values()),
+            "opened": self.opened,
+            "reopened": self.reopened,
+            "updated": self.updated,
+            "closed": self.closed,
+            "suppressed": self.suppressed,
+        }
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Benchmark des octets envoyés à un tableau de bord : protocole admin 1 vs 2
+
+Simule une flotte de livreurs qui envoient une position par seconde et mesure
+le volume JSON reçu par un admin en protocole 1 (dict complet par livreur) et
+en protocole 2 (snapshot puis deltas de champs).
+
+Usage: python bench_admin_protocol.py [livreurs] [secondes]
+"""
+import asyncio
+import json
+import random
+import sys
+from datetime import datetime, timedelta
+
+from server import ConnectionManager
+
+
+class CountingSocket:
+    def __init__(self):
+        self.bytes = 0
+        self.frames = 0
+
+    async def accept(self):
+        pass
+
+    async def send_json(self, message):
+        self.bytes += len(json.dumps(message, separators=(",", ":"), ensure_ascii=False).encode())
+        self.frames += 1
+
+
+def fleet(drivers):
+    return [{
+        "driver_id": f"driver-{i}",
+        "driver_name": f"Livreur {i}",
+        "delivery_id": f"delivery-{i}",
+        "route_id": "route-chateau",
+        "route_name": "Château de Versailles",
+        "latitude": 48.8049 + random.uniform(-0.01, 0.01),
+        "longitude": 2.1201 + random.uniform(-0.01, 0.01),
+        "speed": 20.0,
+        "heading": 90.0,
+        "status": "en_route",
+        "vehicle_type": "van",
+        "license_plate": f"AB-{i:03d}-CD",
+        "last_update": "",
+        "alerts": [],
+    } for i in range(drivers)]
+
+
+async def run(drivers, seconds, hz):
+    manager = ConnectionManager()
+    manager.broadcast_hz = hz
+    v1, v2 = CountingSocket(), CountingSocket()
+    await manager.connect_admin(v1, protocol=1)
+    await manager.connect_admin(v2, protocol=2)
+    state = fleet(drivers)
+    now = datetime.utcnow()
+    for second in range(seconds):
+        for driver in state:
+            driver = dict(driver)
+            driver["latitude"] += random.uniform(-0.0001, 0.0001)
+            driver["longitude"] += random.uniform(-0.0001, 0.0001)
+            driver["last_update"] = (now + timedelta(seconds=second)).isoformat()
+            await manager.broadcast_location(driver)
+        if hz > 0:
+            await manager.flush_locations()
+        await asyncio.sleep(0)
+    await asyncio.sleep(0.1)
+    return v1, v2
+
+
+def main():
+    drivers = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    seconds = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    random.seed(42)
+    print(f"📊 {drivers} livreurs, {seconds} s à 1 ping/s")
+    print(f"{'mode':<22} {'trames v1':>10} {'Mo v1':>8} {'trames v2':>10} {'Mo v2':>8} {'gain':>6}")
+    for label, hz in (("immédiat", 0), ("tick 1 Hz", 1)):
+        v1, v2 = asyncio.run(run(drivers, seconds, hz))
+        print(f"{label:<22} {v1.frames:>10} {v1.bytes / 1e6:>8.2f} {v2.frames:>10} {v2.bytes / 1e6:>8.2f} "
+              f"{v1.bytes / max(v2.bytes, 1):>5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
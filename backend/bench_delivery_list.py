@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Benchmark de la liste des livraisons : documents complets vs projection
+
+Génère des livraisons avec un QR code embarqué (ancien format) dans une base
+dédiée (DB_NAME + "_bench"), puis compare la taille de la réponse JSON et la
+durée de la requête de liste (100 livraisons) avec le document complet et avec
+la projection utilisée par défaut par GET /api/deliveries.
+
+Usage: python bench_delivery_list.py [livraisons]
+"""
+import asyncio
+import base64
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from qr_service import delivery_qr_data, qr_payload, render_png
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+db_name = os.environ.get('DB_NAME', 'delivery_tracker') + "_bench"
+
+SORT = [("created_at", -1), ("id", -1)]
+
+def deliveries(n):
+    now = datetime.utcnow()
+    for i in range(n):
+        doc = {
+            "id": str(uuid.uuid4()),
+            "route_id": "route-chateau",
+            "route_name": "Château de Versailles",
+            "status": ("pending", "in_progress", "completed")[i % 3],
+            "scheduled_time": now + timedelta(hours=i % 48),
+            "company": f"Entreprise {i % 40}",
+            "vehicle_type": "truck",
+            "created_at": now - timedelta(minutes=i),
+        }
+        doc["qr_code"] = base64.b64encode(render_png(qr_payload(delivery_qr_data(doc)))).decode()
+        yield doc
+
+def serialize(doc):
+    doc.pop('_id', None)
+    return {k: v.isoformat() if isinstance(v, datetime) else v for k, v in doc.items()}
+
+async def list_timing(collection, projection, runs=50):
+    timings, size = [], 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        docs = await collection.find({}, projection).sort(SORT).limit(100).to_list(100)
+        timings.append((time.perf_counter() - start) * 1000)
+        size = len(json.dumps([serialize(d) for d in docs]))
+    timings.sort()
+    return size, timings[len(timings) // 2], timings[int(len(timings) * 0.95)]
+
+async def main(n):
+    client = AsyncIOMotorClient(mongo_url, serverSelectionTimeoutMS=10000)
+    db = client[db_name]
+    await client.drop_database(db_name)
+    try:
+        print(f"📊 {n} livraisons, page de 100")
+        await db.deliveries.insert_many(list(deliveries(n)))
+        await db.deliveries.create_index(SORT)
+        print(f"{'mode':<22} {'réponse':>10} {'p50':>9} {'p95':>9}")
+        for label, projection in (("document complet", None), ("projection (défaut)", {"qr_code": 0})):
+            size, p50, p95 = await list_timing(db.deliveries, projection)
+            print(f"{label:<22} {size / 1000:>7.1f} Ko {p50:>6.2f} ms {p95:>6.2f} ms")
+    finally:
+        await client.drop_database(db_name)
+        client.close()
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    asyncio.run(main(n))
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Benchmark du moteur de déviation (geo.RoutePolyline) face à l'ancien check_deviation"""
+import random
+import time
+from math import radians, cos, sin, asin, sqrt
+
+import numpy as np
+
+from geo import RoutePolyline
+
+
+def calculate_distance(lat1, lng1, lat2, lng2):
+    R = 6371000
+    lat1, lng1, lat2, lng2 = map(radians, [lat1, lng1, lat2, lng2])
+    dlat = lat2 - lat1
+    dlng = lng2 - lng1
+    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlng/2)**2
+    return 2 * R * asin(sqrt(a))
+
+
+def check_deviation(current_lat, current_lng, route_waypoints, tolerance=100):
+    """Ancienne implémentation : distance aux sommets uniquement"""
+    for waypoint in route_waypoints:
+        dist = calculate_distance(current_lat, current_lng, waypoint['lat'], waypoint['lng'])
+        if dist < tolerance:
+            return False
+    return True
+
+
+def make_route(n_waypoints):
+    lat, lng = 48.8049, 2.1201
+    waypoints = []
+    for i in range(n_waypoints):
+        waypoints.append({"lat": lat, "lng": lng, "order": i + 1})
+        lat += random.uniform(-0.002, 0.002)
+        lng += random.uniform(-0.002, 0.002)
+    return waypoints
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    random.seed(42)
+    n_pings = 1000
+    print(f"{'waypoints':>10} {'ancien/ping':>14} {'numpy/ping':>14} {'numpy lot/ping':>16} {'écarts':>8}")
+    for n in (2, 10, 50, 200):
+        waypoints = make_route(n)
+        polyline = RoutePolyline([(w['lat'], w['lng']) for w in waypoints])
+        pings = [(w['lat'] + random.uniform(-0.001, 0.001), w['lng'] + random.uniform(-0.001, 0.001))
+                 for w in random.choices(waypoints, k=n_pings)]
+        lats = np.array([p[0] for p in pings])
+        lngs = np.array([p[1] for p in pings])
+
+        legacy = timed(lambda: [check_deviation(lat, lng, waypoints) for lat, lng in pings], 3) / n_pings
+        single = timed(lambda: [polyline.deviates(lat, lng, 100) for lat, lng in pings], 3) / n_pings
+        batch = timed(lambda: polyline.match_many(lats, lngs), 10) / n_pings
+
+        # Pings entre deux sommets : l'ancien test les signale à tort
+        old = np.array([check_deviation(lat, lng, waypoints) for lat, lng in pings])
+        new = polyline.match_many(lats, lngs)[0] > 100
+        print(f"{n:>10} {legacy * 1e6:>11.1f} µs {single * 1e6:>11.1f} µs {batch * 1e6:>13.2f} µs {int((old != new).sum()):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""Benchmark du décodage d'un ping livreur : trame JSON vs trame binaire
+
+Mesure le temps CPU par ping du décodage jusqu'au LocationUpdate, pour le
+chemin JSON historique et pour la trame binaire LOCATION_FRAME.
+
+Usage: python bench_driver_frames.py [pings]
+"""
+import json
+import sys
+import time
+
+from server import LOCATION_FRAME, LocationUpdate, decode_location_frame
+
+
+def decode_json(driver_id, text):
+    """Chemin JSON de websocket_driver"""
+    data = json.loads(text)
+    if data.get('type') == 'location':
+        return LocationUpdate(
+            driver_id=driver_id,
+            delivery_id=data.get('delivery_id', ''),
+            latitude=data.get('latitude', 0),
+            longitude=data.get('longitude', 0),
+            speed=data.get('speed', 0),
+            heading=data.get('heading', 0)
+        )
+
+
+def cpu_per_ping(fn, frames):
+    start = time.process_time()
+    for frame in frames:
+        fn(frame)
+    return (time.process_time() - start) / len(frames)
+
+
+def main():
+    pings = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    delivery_id = "3f2b8c1e-9d4a-4c6b-8e7f-1a2b3c4d5e6f"
+    slots = [delivery_id]
+    now = time.time()
+    text_frames = [json.dumps({
+        "type": "location", "delivery_id": delivery_id,
+        "latitude": 48.8049 + i * 1e-6, "longitude": 2.1201 + i * 1e-6,
+        "speed": 23.5, "heading": 181.0,
+    }) for i in range(pings)]
+    binary_frames = [LOCATION_FRAME.pack(0, 48.8049 + i * 1e-6, 2.1201 + i * 1e-6, 23.5, 181.0, now + i)
+                     for i in range(pings)]
+
+    json_cpu = cpu_per_ping(lambda f: decode_json("driver-1", f), text_frames)
+    binary_cpu = cpu_per_ping(lambda f: decode_location_frame("driver-1", f, slots), binary_frames)
+
+    print(f"📊 {pings} pings")
+    print(f"{'format':<8} {'octets':>7} {'CPU/ping':>10}")
+    print(f"{'json':<8} {len(text_frames[0].encode()):>7} {json_cpu * 1e6:>7.2f} µs")
+    print(f"{'binaire':<8} {LOCATION_FRAME.size:>7} {binary_cpu * 1e6:>7.2f} µs")
+    print(f"gain CPU: {json_cpu / binary_cpu:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Benchmark du stockage de location_history : collection classique vs time-series
+
+Génère un jeu de données synthétique dans une base dédiée (DB_NAME + "_bench"),
+puis compare la taille de stockage et la latence d'une requête d'historique
+(une livraison, plage horaire) pour les deux modes.
+
+Usage: python bench_location_history.py [livreurs] [points_par_livreur]
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import history_store
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+db_name = os.environ.get('DB_NAME', 'delivery_tracker') + "_bench"
+
+def synthetic_pings(drivers, points):
+    start = datetime.utcnow() - timedelta(seconds=points)
+    for d in range(drivers):
+        lat, lng = 48.8049, 2.1201
+        for i in range(points):
+            lat += random.uniform(-0.00005, 0.00005)
+            lng += random.uniform(-0.00005, 0.00005)
+            yield {
+                "driver_id": f"driver-{d}",
+                "delivery_id": f"delivery-{d}",
+                "latitude": lat,
+                "longitude": lng,
+                "speed": random.uniform(0, 40),
+                "heading": random.uniform(0, 360),
+                "timestamp": start + timedelta(seconds=i),
+            }
+
+async def load(collection, docs, timeseries):
+    batch = []
+    for doc in docs:
+        batch.append(history_store.to_timeseries(doc) if timeseries else doc)
+        if len(batch) >= 10000:
+            await collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await collection.insert_many(batch, ordered=False)
+
+async def query_latency(collection, drivers, points, timeseries, runs=50):
+    end = datetime.utcnow()
+    timings = []
+    for _ in range(runs):
+        delivery_id = f"delivery-{random.randrange(drivers)}"
+        query = history_store.delivery_filter(delivery_id, timeseries)
+        query["timestamp"] = {"$gte": end - timedelta(seconds=points // 2)}
+        start = time.perf_counter()
+        await collection.find(query).sort("timestamp", 1).to_list(None)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.95)]
+
+async def main(drivers, points):
+    client = AsyncIOMotorClient(mongo_url, serverSelectionTimeoutMS=10000)
+    db = client[db_name]
+    await client.drop_database(db_name)
+    print(f"📊 {drivers} livreurs × {points} points = {drivers * points} documents")
+    print(f"{'mode':<14} {'stockage':>10} {'index':>10} {'p50':>9} {'p95':>9}")
+    try:
+        for mode, timeseries in (("classique", False), ("time-series", True)):
+            name = f"history_{'ts' if timeseries else 'plain'}"
+            random.seed(42)
+            if timeseries:
+                await history_store.ensure_timeseries(db, name)
+            await load(db[name], synthetic_pings(drivers, points), timeseries)
+            stats = await db.command("collStats", name)
+            p50, p95 = await query_latency(db[name], drivers, points, timeseries)
+            print(f"{mode:<14} {stats.get('storageSize', 0) / 1e6:>8.1f}Mo {stats.get('totalIndexSize', 0) / 1e6:>8.1f}Mo "
+                  f"{p50:>6.1f} ms {p95:>6.1f} ms")
+    finally:
+        await client.drop_database(db_name)
+        client.close()
+
+if __name__ == "__main__":
+    drivers = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    points = int(sys.argv[2]) if len(sys.argv) > 2 else 3600
+    asyncio.run(main(drivers, points))
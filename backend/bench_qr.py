@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Benchmark de la latence des pings pendant une création massive de livraisons
+
+Une sonde planifiée toutes les 10 ms mesure son retard sur la boucle asyncio,
+c'est-à-dire le délai que subirait le traitement d'un ping WebSocket, pendant
+que des QR codes sont générés : sur la boucle (ancien comportement), puis via
+le pool de processus de QRService.
+
+Usage: python bench_qr.py [livraisons] [workers]
+"""
+import asyncio
+import sys
+import time
+import uuid
+from datetime import datetime
+
+from qr_service import QRService, qr_payload, render_png
+
+PROBE_INTERVAL = 0.01
+
+def qr_data():
+    return {"delivery_id": str(uuid.uuid4()), "route_id": "route-chateau",
+            "scheduled_time": datetime.utcnow().isoformat()}
+
+async def probe(lags, stop):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + PROBE_INTERVAL
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(max(0.0, loop.time() - expected) * 1000)
+
+async def measure(render, deliveries, concurrency=8):
+    lags, stop = [], asyncio.Event()
+    task = asyncio.create_task(probe(lags, stop))
+    await asyncio.sleep(0.2)
+    idle = len(lags)
+    start = time.perf_counter()
+    queue = [qr_data() for _ in range(deliveries)]
+
+    async def worker():
+        while queue:
+            await render(queue.pop())
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await task
+    busy = sorted(lags[idle:]) or [0.0]
+    return elapsed, busy[len(busy) // 2], busy[int(len(busy) * 0.99)], busy[-1]
+
+async def main(deliveries, workers):
+    print(f"📊 {deliveries} QR codes, sonde toutes les {PROBE_INTERVAL * 1000:.0f} ms")
+    print(f"{'mode':<24} {'durée':>8} {'p50':>9} {'p99':>9} {'max':>9}")
+
+    async def on_loop(data):
+        render_png(qr_payload(data))
+        await asyncio.sleep(0)  # fin de la requête : la boucle reprend la main
+
+    service = QRService(workers=workers)
+    service.start()
+    await service.png(qr_data())  # démarrage des processus hors mesure
+    try:
+        for label, render in (("sur la boucle (avant)", on_loop), (f"pool {workers} processus", service.png)):
+            elapsed, p50, p99, worst = await measure(render, deliveries)
+            print(f"{label:<24} {elapsed:>7.2f}s {p50:>6.1f} ms {p99:>6.1f} ms {worst:>6.1f} ms")
+    finally:
+        service.stop()
+
+if __name__ == "__main__":
+    deliveries = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    asyncio.run(main(deliveries, workers))
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Benchmark de la sérialisation des réponses de liste
+
+Compare, sur des documents synthétiques tels que les renvoie Motor (_id
+ObjectId, dates datetime), l'ancien chemin (serialize_doc puis
+jsonable_encoder et JSONResponse de FastAPI) et le nouveau (prepare_doc puis
+un seul passage orjson vers des octets).
+
+Usage: python bench_serialization.py [documents] [répétitions]
+"""
+import copy
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from serialization import dumps, prepare_doc
+from server import serialize_doc
+
+def history_docs(n):
+    start = datetime.utcnow()
+    return [{
+        "_id": ObjectId(),
+        "driver_id": "driver-1",
+        "delivery_id": "delivery-1",
+        "latitude": 48.8049 + i * 1e-5,
+        "longitude": 2.1201 + i * 1e-5,
+        "speed": 18.5,
+        "heading": 92.0,
+        "timestamp": start + timedelta(seconds=i),
+    } for i in range(n)]
+
+def delivery_docs(n):
+    now = datetime.utcnow()
+    return [{
+        "_id": ObjectId(),
+        "id": str(uuid.uuid4()),
+        "driver_id": str(uuid.uuid4()),
+        "driver_name": "Jean Dupont",
+        "route_id": "route-chateau",
+        "route_name": "Château de Versailles",
+        "status": "in_progress",
+        "scheduled_time": now,
+        "start_time": now,
+        "end_time": None,
+        "company": "Entreprise Générale",
+        "notes": "Livraison par l'entrée nord",
+        "vehicle_type": "truck",
+        "license_plate": "AB-123-CD",
+        "created_at": now - timedelta(minutes=i),
+    } for i in range(n)]
+
+def legacy(docs):
+    return JSONResponse(jsonable_encoder([serialize_doc(d) for d in docs])).body
+
+def fast(docs):
+    return dumps([prepare_doc(d) for d in docs])
+
+def timed(fn, docs, runs):
+    timings = []
+    for _ in range(runs):
+        batch = copy.deepcopy(docs)  # prepare_doc modifie les documents reçus
+        start = time.perf_counter()
+        body = fn(batch)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2], len(body)
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    print(f"📊 {n} documents, médiane sur {runs} requêtes")
+    print(f"{'collection':<14} {'avant':>10} {'après':>10} {'gain':>7} {'octets':>10}")
+    for label, docs in (("historique", history_docs(n)), ("livraisons", delivery_docs(n))):
+        before, size_before = timed(legacy, docs, runs)
+        after, size_after = timed(fast, docs, runs)
+        print(f"{label:<14} {before:>7.1f} ms {after:>7.1f} ms {before / after:>6.1f}x {size_after:>10}")
+
+if __name__ == "__main__":
+    main()
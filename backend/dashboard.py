@@ -0,0 +1,178 @@
+"""In-memory dashboard counters kept up to date by the mutation endpoints.
+
+Each counter is a function of a single document (see `delivery_counts` and
+`alert_counts`), so a mutation applies the difference between the document
+before and after it. A periodic `$facet` aggregation rebuilds the counters
+from Mongo to correct any drift, and serves the cold start.
+"""
+import asyncio
+import logging
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+def start_of_day(now: Optional[datetime] = None) -> datetime:
+    return (now or datetime.utcnow()).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def delivery_counts(doc: Optional[dict], today: datetime) -> Counter:
+    counts = Counter()
+    if not doc:
+        return counts
+    counts["total_deliveries"] += 1
+    status = doc.get("status")
+    if status == "pending":
+        counts["pending_deliveries"] += 1
+    elif status == "in_progress":
+        counts["in_progress"] += 1
+    created_at = doc.get("created_at")
+    if created_at and created_at >= today:
+        counts["today_deliveries"] += 1
+    end_time = doc.get("end_time")
+    if status == "completed" and end_time and end_time >= today:
+        counts["completed_today"] += 1
+    return counts
+
+
+def alert_counts(doc: Optional[dict]) -> Counter:
+    counts = Counter()
+    if doc and not doc.get("is_resolved"):
+        counts["active_alerts"] += 1
+        if doc.get("severity") == "critical":
+            counts["critical_alerts"] += 1
+    return counts
+
+
+def delivery_facet(today: datetime) -> list:
+    return [{"$facet": {
+        "total_deliveries": [{"$count": "n"}],
+        "today_deliveries": [{"$match": {"created_at": {"$gte": today}}}, {"$count": "n"}],
+        "pending_deliveries": [{"$match": {"status": "pending"}}, {"$count": "n"}],
+        "in_progress": [{"$match": {"status": "in_progress"}}, {"$count": "n"}],
+        "completed_today": [{"$match": {"status": "completed", "end_time": {"$gte": today}}}, {"$count": "n"}],
+    }}]
+
+
+ALERT_FACET = [{"$match": {"is_resolved": False}}, {"$facet": {
+    "active_alerts": [{"$count": "n"}],
+    "critical_alerts": [{"$match": {"severity": "critical"}}, {"$count": "n"}],
+}}]
+
+
+def facet_counts(result: list) -> Counter:
+    counts = Counter()
+    for name, rows in (result[0] if result else {}).items():
+        counts[name] = rows[0]["n"] if rows else 0
+    return counts
+
+
+class DashboardCounters:
+    """Counters behind /stats/dashboard, reconciled against Mongo every `interval` seconds"""
+
+    FIELDS = ("total_deliveries", "today_deliveries", "pending_deliveries", "in_progress",
+              "completed_today", "active_alerts", "critical_alerts")
+
+    def __init__(self, interval: float = 300):
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self.day = start_of_day()
+        self.ready = False
+        # Deltas applied so far; a reconciliation overlapping any of them cannot measure drift
+        self.writes = 0
+        self.lock = asyncio.Lock()
+        self.task: Optional[asyncio.Task] = None
+        self.reconciliations = 0
+        self.corrections = 0
+        self.last_drift: Dict[str, int] = {}
+        self.reconciled_at: Optional[datetime] = None
+        self.reconcile_ms = 0.0
+
+    def _apply(self, delta: Counter):
+        self.counts.update(delta)
+        self.writes += 1
+
+    def delivery_changed(self, before: Optional[dict], after: Optional[dict]) -> Counter:
+        """Apply the change of one delivery; returns the delta for the other workers"""
+        delta = delivery_counts(after, self.day)
+        delta.subtract(delivery_counts(before, self.day))
+        self._apply(delta)
+        return delta
+
+    def alert_changed(self, before: Optional[dict], after: Optional[dict]) -> Counter:
+        delta = alert_counts(after)
+        delta.subtract(alert_counts(before))
+        self._apply(delta)
+        return delta
+
+    def merge(self, delta: Dict[str, int]):
+        """Apply a delta computed by another worker"""
+        self._apply(Counter(delta))
+
+    async def reconcile(self, db):
+        """Rebuild every counter from one $facet aggregation per collection.
+
+        The aggregate is taken as-is. A write committed during the read may or
+        may not be in it, so replaying the deltas applied meanwhile could
+        count it twice; a write the aggregate missed is picked up by the next
+        reconciliation instead. Drift is only measured when no delta was
+        applied during the read.
+        """
+        async with self.lock:
+            start = time.perf_counter()
+            today = start_of_day()
+            writes = self.writes
+            deliveries = await db.deliveries.aggregate(delivery_facet(today)).to_list(1)
+            alerts = await db.alerts.aggregate(ALERT_FACET).to_list(1)
+            counts = facet_counts(deliveries) + facet_counts(alerts)
+            if self.ready and today == self.day and self.writes == writes:
+                drift = {f: counts[f] - self.counts[f] for f in self.FIELDS if counts[f] != self.counts[f]}
+                if drift:
+                    self.corrections += 1
+                    logger.warning(f"Dashboard counters drifted: {drift}")
+                self.last_drift = drift
+            self.counts = counts
+            self.day = today
+            self.ready = True
+            self.reconciliations += 1
+            self.reconciled_at = datetime.utcnow()
+            self.reconcile_ms = (time.perf_counter() - start) * 1000
+
+    async def snapshot(self, db) -> Dict[str, int]:
+        # Day-based counters restart at midnight; cold start has nothing to serve yet
+        if not self.ready or start_of_day() != self.day:
+            await self.reconcile(db)
+        return {f: max(self.counts[f], 0) for f in self.FIELDS}
+
+    def start(self, db):
+        if self.task is None and self.interval > 0:
+            self.task = asyncio.create_task(self._run(db))
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _run(self, db):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.reconcile(db)
+            except Exception as e:
+                logger.error(f"Dashboard reconciliation failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "reconciliations": self.reconciliations,
+            "corrections": self.corrections,
+            "last_drift": self.last_drift,
+            "reconcile_ms": round(self.reconcile_ms, 2),
+            "reconciled_at": self.reconciled_at.isoformat() if self.reconciled_at else None,
+        }
@@ -0,0 +1,177 @@
+"""Route geometry backed by NumPy.
+
+Routes are projected once into a local equirectangular frame (metres around the
+route centroid), which is accurate to well under a metre at the scale of a city
+and turns every distance query into plain vector arithmetic.
+"""
+from typing import NamedTuple, Optional, Sequence, Tuple
+import bisect
+import math
+
+import numpy as np
+
+EARTH_RADIUS = 6371000  # metres
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    """Great-circle distance in metres, element-wise over NumPy arrays"""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+
+class LocalProjection:
+    """Equirectangular projection to metres around a reference point"""
+
+    def __init__(self, lat0: float, lng0: float):
+        self.lat0 = lat0
+        self.lng0 = lng0
+        self.ky = EARTH_RADIUS * math.pi / 180
+        self.kx = self.ky * math.cos(math.radians(lat0))
+
+    def project(self, lats, lngs) -> np.ndarray:
+        lats = np.asarray(lats, dtype=np.float64)
+        lngs = np.asarray(lngs, dtype=np.float64)
+        return np.stack([(lngs - self.lng0) * self.kx, (lats - self.lat0) * self.ky], axis=-1)
+
+
+class RouteMatch(NamedTuple):
+    distance: float  # metres from the ping to the route
+    segment: int  # index of the nearest segment
+    offset: float  # metres along the route to the projected point
+
+
+def route_points(route: dict) -> list:
+    """Ordered (lat, lng) vertices of a route: its waypoints then the destination"""
+    waypoints = sorted(route.get('waypoints', []), key=lambda w: w.get('order', 0))
+    points = [(w['lat'], w['lng']) for w in waypoints]
+    destination = route.get('destination') or {}
+    if 'lat' in destination and 'lng' in destination:
+        end = (destination['lat'], destination['lng'])
+        if not points or points[-1] != end:
+            points.append(end)
+    return points
+
+
+class RoutePolyline(LocalProjection):
+    """A route polyline precomputed for vectorized point-to-segment queries"""
+
+    def __init__(self, points: Sequence[Tuple[float, float]]):
+        if not points:
+            raise ValueError("A polyline needs at least one point")
+        coords = np.asarray(points, dtype=np.float64)
+        if len(coords) == 1:
+            coords = np.vstack([coords, coords])
+        super().__init__(float(coords[:, 0].mean()), float(coords[:, 1].mean()))
+
+        xy = self.project(coords[:, 0], coords[:, 1])
+        self.starts = xy[:-1]
+        self.vectors = xy[1:] - xy[:-1]
+        self.lengths = np.hypot(self.vectors[:, 0], self.vectors[:, 1])
+        # Zero-length segments project every point onto their start
+        self.inv_lengths2 = np.divide(
+            1.0, self.lengths ** 2, out=np.zeros_like(self.lengths), where=self.lengths > 0
+        )
+        self.cumulative = np.concatenate(([0.0], np.cumsum(self.lengths)))
+        # Contiguous per-axis copies for the single-ping path
+        self.sx, self.sy = self.starts[:, 0].copy(), self.starts[:, 1].copy()
+        self.vx, self.vy = self.vectors[:, 0].copy(), self.vectors[:, 1].copy()
+
+    def match_many(self, lats, lngs) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Distance, nearest segment and route offset for a batch of pings"""
+        points = self.project(np.atleast_1d(lats), np.atleast_1d(lngs))
+        rel = points[:, None, :] - self.starts[None, :, :]
+        t = np.clip((rel * self.vectors).sum(axis=2) * self.inv_lengths2, 0.0, 1.0)
+        delta = rel - t[:, :, None] * self.vectors
+        dist2 = (delta ** 2).sum(axis=2)
+        segment = dist2.argmin(axis=1)
+        rows = np.arange(len(points))
+        distance = np.sqrt(dist2[rows, segment])
+        offset = self.cumulative[segment] + t[rows, segment] * self.lengths[segment]
+        return distance, segment, offset
+
+    def match(self, lat: float, lng: float) -> RouteMatch:
+        """Same as match_many for one ping, without the batch bookkeeping"""
+        rx = (lng - self.lng0) * self.kx - self.sx
+        ry = (lat - self.lat0) * self.ky - self.sy
+        t = (rx * self.vx + ry * self.vy) * self.inv_lengths2
+        np.minimum(np.maximum(t, 0.0, out=t), 1.0, out=t)
+        dx = rx - t * self.vx
+        dy = ry - t * self.vy
+        dist2 = dx * dx + dy * dy
+        i = int(dist2.argmin())
+        return RouteMatch(math.sqrt(dist2[i]), i, float(self.cumulative[i] + t[i] * self.lengths[i]))
+
+    def deviates(self, lat: float, lng: float, tolerance: float) -> bool:
+        return self.match(lat, lng).distance > tolerance
+
+
+class SpeedProfile:
+    """Speed limits along a route, found by binary search on the distance travelled.
+
+    `speed_limits` entries are {start, end, limit} with start/end in km along
+    the route; an optional `vehicle_limits` mapping ({"truck": 20}) overrides
+    the limit per vehicle type. Intervals are expected not to overlap; any
+    distance they do not cover gets `default`.
+    """
+
+    def __init__(self, speed_limits: Sequence[dict], default: float):
+        intervals = sorted(
+            (float(s.get('start', 0)) * 1000, float(s.get('end', 0)) * 1000, s)
+            for s in speed_limits if 'limit' in s
+        )
+        self.starts = [start for start, _, _ in intervals]
+        self.intervals = intervals
+        self.default = default
+
+    def limit_at(self, offset: Optional[float], vehicle_type: Optional[str] = None) -> float:
+        """Limit in km/h at `offset` metres along the route"""
+        if offset is None or not self.intervals:
+            return self.default
+        i = bisect.bisect_right(self.starts, offset) - 1
+        if i < 0:
+            return self.default
+        _, end, interval = self.intervals[i]
+        if offset > end:
+            return self.default
+        vehicle_limits = interval.get('vehicle_limits') or {}
+        return float(vehicle_limits.get(vehicle_type, interval['limit']))
+
+
+def simplify(lats, lngs, tolerance: float) -> np.ndarray:
+    """Indices of the points kept by Douglas-Peucker at `tolerance` metres.
+
+    Every dropped point lies within `tolerance` of the simplified polyline,
+    so any excursion wider than that (a deviation, a detour) is preserved.
+    Distances are taken to the segment, not its supporting line, so
+    back-and-forth movements are not folded away.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    n = len(lats)
+    if n <= 2 or tolerance <= 0:
+        return np.arange(n)
+    xy = LocalProjection(float(lats.mean()), float(lngs.mean())).project(lats, lngs)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    tolerance2 = tolerance * tolerance
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start = xy[first]
+        vector = xy[last] - start
+        rel = xy[first + 1:last] - start
+        length2 = float(vector @ vector)
+        if length2 > 0:
+            t = np.clip(rel @ vector / length2, 0.0, 1.0)
+            rel = rel - t[:, None] * vector
+        dist2 = np.einsum('ij,ij->i', rel, rel)
+        i = int(dist2.argmax())
+        if dist2[i] > tolerance2:
+            split = first + 1 + i
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return np.flatnonzero(keep)
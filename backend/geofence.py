@@ -0,0 +1,69 @@
+"""Stateful geofencing of drivers against route danger and restricted zones."""
+from typing import Dict, Iterable, List, Set, Tuple
+
+from spatial import CircleIndex
+
+ZONE_KINDS = ("danger_zones", "restricted_zones")
+
+
+def zone_id(kind: str, zone: dict) -> str:
+    """Stable id from the zone geometry, so routes sharing a zone share its state"""
+    return f"{kind}:{zone['lat']:.6f}:{zone['lng']:.6f}:{float(zone.get('radius', 0)):g}"
+
+
+class GeofenceEngine:
+    """Tracks which zones each driver is inside and reports entries and exits.
+
+    Zones from every active route are indexed together; identical circles
+    declared on several routes are merged into one zone.
+    """
+
+    def __init__(self):
+        self.zones: Dict[str, dict] = {}
+        self.index = CircleIndex([], self._locate)
+        self.inside: Dict[str, Set[str]] = {}
+        self.version = None
+
+    @staticmethod
+    def _locate(zone: dict) -> Tuple[float, float, float]:
+        return zone['lat'], zone['lng'], float(zone.get('radius', 0))
+
+    def rebuild(self, routes: Iterable[dict], version=None):
+        zones = {}
+        for route in routes:
+            if not route.get('is_active', True):
+                continue
+            for kind in ZONE_KINDS:
+                for zone in route.get(kind) or []:
+                    if 'lat' not in zone or 'lng' not in zone:
+                        continue
+                    zid = zone_id(kind, zone)
+                    if zid not in zones:
+                        zones[zid] = {**zone, "id": zid, "kind": kind, "route_ids": []}
+                    zones[zid]["route_ids"].append(route.get('id'))
+        self.zones = zones
+        self.index = CircleIndex(list(zones.values()), self._locate)
+        self.version = version
+
+    def update(self, driver_id: str, lat: float, lng: float) -> Tuple[List[dict], List[dict]]:
+        """Move a driver; returns the zones it entered and the zones it left"""
+        current = {zone['id'] for zone in self.index.containing(lat, lng)}
+        previous = self.inside.get(driver_id, set())
+        if current == previous:
+            return [], []
+        if current:
+            self.inside[driver_id] = current
+        else:
+            self.inside.pop(driver_id, None)
+        entered = [self.zones[z] for z in current - previous]
+        exited = [self.zones[z] for z in previous - current if z in self.zones]
+        return entered, exited
+
+    def forget(self, driver_id: str):
+        self.inside.pop(driver_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "zones": len(self.zones),
+            "drivers_inside": len(self.inside),
+        }
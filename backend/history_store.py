@@ -0,0 +1,61 @@
+"""Storage layout of the location_history collection.
+
+By default pings are stored as flat documents in a regular collection. With
+LOCATION_HISTORY_TIMESERIES enabled the collection is a MongoDB time-series
+collection bucketed on `timestamp`, with driver_id and delivery_id grouped in
+the `meta` field.
+"""
+import os
+
+COLLECTION = "location_history"
+
+TIMESERIES_ENABLED = os.environ.get('LOCATION_HISTORY_TIMESERIES', '').lower() in ('1', 'true', 'yes')
+
+TIMESERIES_OPTIONS = {"timeField": "timestamp", "metaField": "meta", "granularity": "seconds"}
+
+# Secondary index backing the per-delivery history query
+TIMESERIES_INDEX = [("meta.delivery_id", 1), ("timestamp", 1)]
+
+META_FIELDS = ("driver_id", "delivery_id")
+
+
+def to_timeseries(doc: dict) -> dict:
+    """Flat location document -> time-series measurement"""
+    measurement = {k: v for k, v in doc.items() if k not in META_FIELDS and k != '_id'}
+    measurement["meta"] = {k: doc.get(k) for k in META_FIELDS}
+    return measurement
+
+
+def from_timeseries(doc: dict) -> dict:
+    """Time-series measurement -> flat location document as returned by the API"""
+    flat = {k: v for k, v in doc.items() if k != 'meta'}
+    flat.update(doc.get('meta') or {})
+    return flat
+
+
+def delivery_filter(delivery_id: str, timeseries: bool) -> dict:
+    if timeseries:
+        return {"meta.delivery_id": delivery_id}
+    return {"delivery_id": delivery_id}
+
+
+async def is_timeseries(db, name: str = COLLECTION) -> bool:
+    cursor = await db.list_collections(filter={"name": name})
+    async for info in cursor:
+        return info.get('type') == 'timeseries'
+    return False
+
+
+async def ensure_timeseries(db, name: str = COLLECTION) -> bool:
+    """Create the time-series collection and its index if missing.
+
+    Returns False when a regular collection already holds the history, in
+    which case migrate_location_history.py has to be run first.
+    """
+    names = await db.list_collection_names(filter={"name": name})
+    if names and not await is_timeseries(db, name):
+        return False
+    if not names:
+        await db.create_collection(name, timeseries=TIMESERIES_OPTIONS)
+    await db[name].create_index(TIMESERIES_INDEX)
+    return True
@@ -0,0 +1,111 @@
+"""Declarative MongoDB indexes, applied idempotently at startup.
+
+QUERY_SHAPES lists the filter/sort combinations server.py runs on request
+paths; test_indexes.py checks with explain() that each of them is served by
+one of the INDEXES below. Add the shape here when an endpoint adds a query.
+TIMESERIES_SHAPES are the history queries of the time-series layout, served
+by history_store.TIMESERIES_INDEX.
+"""
+import logging
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+import history_store
+from pagination import after
+
+logger = logging.getLogger(__name__)
+
+# collection -> [(keys, options)]
+INDEXES: Dict[str, List[Tuple[list, dict]]] = {
+    "users": [
+        ([("email", ASCENDING)], {"name": "email_unique", "unique": True}),
+        ([("id", ASCENDING)], {"name": "id_unique", "unique": True}),
+    ],
+    "deliveries": [
+        ([("id", ASCENDING)], {"name": "id_unique", "unique": True}),
+        ([("created_at", DESCENDING), ("id", DESCENDING)], {"name": "created_at_id"}),
+        ([("status", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], {"name": "status_created_at_id"}),
+    ],
+    "delivery_qr": [
+        ([("delivery_id", ASCENDING)], {"name": "delivery_id_unique", "unique": True}),
+    ],
+    "routes": [
+        ([("id", ASCENDING)], {"name": "id_unique", "unique": True}),
+        ([("is_active", ASCENDING)], {"name": "is_active"}),
+    ],
+    "alerts": [
+        ([("id", ASCENDING)], {"name": "id_unique", "unique": True}),
+        ([("created_at", DESCENDING), ("id", DESCENDING)], {"name": "created_at_id"}),
+        ([("is_resolved", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], {"name": "is_resolved_created_at_id"}),
+    ],
+    "cameras": [
+        # Also serializes concurrent demo seeding from several workers
+        ([("id", ASCENDING)], {"name": "id_unique", "unique": True}),
+        ([("is_active", ASCENDING)], {"name": "is_active"}),
+    ],
+    # Regular collection layout; the time-series layout gets TIMESERIES_INDEX from history_store
+    history_store.COLLECTION: [
+        ([("delivery_id", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)], {"name": "delivery_id_timestamp_id"}),
+    ],
+}
+
+def page_shape(collection: str, query: dict, sort: list, values: list) -> Tuple[str, dict, list]:
+    """Shape of a page after the first: the keyset filter fetch_page adds for a cursor"""
+    return collection, {"$and": [query, after(sort, values)]}, sort
+
+# (collection, filter, sort) run on request paths
+QUERY_SHAPES: List[Tuple[str, dict, list]] = [
+    ("users", {"email": "x"}, None),
+    ("users", {"id": "x"}, None),
+    ("users", {"id": {"$in": ["x", "y"]}}, None),
+    ("deliveries", {"id": "x"}, None),
+    ("deliveries", {"id": {"$in": ["x", "y"]}}, None),
+    ("deliveries", {}, [("created_at", DESCENDING), ("id", DESCENDING)]),
+    ("deliveries", {"status": "pending"}, [("created_at", DESCENDING), ("id", DESCENDING)]),
+    ("delivery_qr", {"delivery_id": {"$in": ["x", "y"]}}, None),
+    ("routes", {"id": "x"}, None),
+    ("routes", {"id": {"$in": ["x", "y"]}}, None),
+    ("routes", {"is_active": True}, None),
+    ("alerts", {"id": "x"}, None),
+    ("alerts", {"id": "x", "is_resolved": False}, None),
+    ("alerts", {}, [("created_at", DESCENDING), ("id", DESCENDING)]),
+    ("alerts", {"is_resolved": False}, [("created_at", DESCENDING), ("id", DESCENDING)]),
+    ("cameras", {"is_active": True}, None),
+    (history_store.COLLECTION, {"delivery_id": "x"}, [("timestamp", ASCENDING), ("_id", ASCENDING)]),
+    # Cursor pages of the list endpoints
+    page_shape("deliveries", {}, [("created_at", DESCENDING), ("id", DESCENDING)], [datetime.utcnow(), "x"]),
+    page_shape("deliveries", {"status": "pending"}, [("created_at", DESCENDING), ("id", DESCENDING)], [datetime.utcnow(), "x"]),
+    page_shape("alerts", {}, [("created_at", DESCENDING), ("id", DESCENDING)], [datetime.utcnow(), "x"]),
+    page_shape("alerts", {"is_resolved": False}, [("created_at", DESCENDING), ("id", DESCENDING)], [datetime.utcnow(), "x"]),
+    page_shape(history_store.COLLECTION, {"delivery_id": "x"}, [("timestamp", ASCENDING), ("_id", ASCENDING)], [datetime.utcnow(), ObjectId()]),
+]
+
+# Same, on location_history when LOCATION_HISTORY_TIMESERIES is enabled
+TIMESERIES_SHAPES: List[Tuple[str, dict, list]] = [
+    (history_store.COLLECTION, {"meta.delivery_id": "x"}, [("timestamp", ASCENDING), ("_id", ASCENDING)]),
+    page_shape(history_store.COLLECTION, {"meta.delivery_id": "x"}, [("timestamp", ASCENDING), ("_id", ASCENDING)], [datetime.utcnow(), ObjectId()]),
+]
+
+
+async def apply_indexes(db, timeseries: bool = False) -> int:
+    """Create every registered index that is missing; returns the number of failures.
+
+    create_index is a no-op for an identical existing index. An index that
+    cannot be built (conflicting options, duplicate keys under a unique
+    index) is logged and skipped so the others still get created.
+    """
+    failures = 0
+    for collection, indexes in INDEXES.items():
+        if timeseries and collection == history_store.COLLECTION:
+            continue
+        for keys, options in indexes:
+            try:
+                await db[collection].create_index(keys, **options)
+            except OperationFailure as e:
+                failures += 1
+                logger.error(f"Index {collection}.{options.get('name')} not created: {e}")
+    return failures
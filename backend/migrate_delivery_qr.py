@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Script pour sortir les images QR des documents de livraison
+
+Copie le champ qr_code (PNG en base64) de chaque livraison dans la collection
+delivery_qr, puis le retire du document de livraison. Reprise possible : seules
+les livraisons qui ont encore un qr_code sont traitées.
+
+Usage: python migrate_delivery_qr.py
+"""
+import asyncio
+import base64
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from qr_service import QRService, delivery_qr_data, qr_payload
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+db_name = os.environ.get('DB_NAME', 'delivery_tracker')
+
+BATCH_SIZE = 500
+
+async def migrate():
+    client = AsyncIOMotorClient(mongo_url, serverSelectionTimeoutMS=10000)
+    db = client[db_name]
+    try:
+        query = {"qr_code": {"$exists": True}}
+        total = await db.deliveries.count_documents(query)
+        print(f"🚚 {total} livraisons avec un QR code embarqué")
+        moved = 0
+        while True:
+            batch = await db.deliveries.find(
+                query, {"id": 1, "route_id": 1, "scheduled_time": 1, "qr_code": 1}
+            ).limit(BATCH_SIZE).to_list(BATCH_SIZE)
+            if not batch:
+                break
+            now = datetime.utcnow()
+            images = [
+                UpdateOne(
+                    {"delivery_id": d['id']},
+                    {"$set": {
+                        "etag": QRService.etag(qr_payload(delivery_qr_data(d))),
+                        "png": base64.b64decode(d['qr_code']),
+                        "created_at": now,
+                    }},
+                    upsert=True
+                )
+                for d in batch if d.get('qr_code')
+            ]
+            if images:
+                await db.delivery_qr.bulk_write(images, ordered=False)
+            await db.deliveries.update_many(
+                {"_id": {"$in": [d['_id'] for d in batch]}},
+                {"$unset": {"qr_code": ""}}
+            )
+            moved += len(batch)
+            print(f"   {moved}/{total}")
+        print(f"✅ {moved} livraisons migrées")
+        return True
+
+    except Exception as e:
+        print(f"❌ Erreur: {e}")
+        return False
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    result = asyncio.run(migrate())
+    sys.exit(0 if result else 1)
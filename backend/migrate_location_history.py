@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Script pour migrer location_history vers une collection time-series MongoDB
+
+Les time-series ne pouvant pas être renommées, la collection existante est
+d'abord renommée en location_history_legacy, puis recopiée par lots dans une
+nouvelle collection time-series location_history.
+
+Usage: python migrate_location_history.py [--drop-legacy]
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import history_store
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+db_name = os.environ.get('DB_NAME', 'delivery_tracker')
+
+LEGACY = history_store.COLLECTION + "_legacy"
+BATCH_SIZE = 5000
+
+async def migrate(drop_legacy=False):
+    client = AsyncIOMotorClient(mongo_url, serverSelectionTimeoutMS=10000)
+    db = client[db_name]
+    try:
+        names = await db.list_collection_names()
+        if history_store.COLLECTION in names:
+            if await history_store.is_timeseries(db):
+                print("✅ location_history est déjà une collection time-series")
+                if LEGACY not in names:
+                    return True
+            else:
+                if LEGACY in names:
+                    print(f"❌ {LEGACY} existe déjà, migration interrompue")
+                    return False
+                await db[history_store.COLLECTION].rename(LEGACY)
+                print(f"📦 location_history renommée en {LEGACY}")
+
+        await history_store.ensure_timeseries(db)
+        target = db[history_store.COLLECTION]
+        source = db[LEGACY]
+
+        # Reprise possible : les points sont recopiés dans l'ordre de leur _id, conservé
+        # dans la cible, donc on repart après le plus grand _id déjà migré
+        query = {}
+        last = await target.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        if last:
+            query = {"_id": {"$gt": last["_id"]}}
+
+        total = await source.count_documents(query)
+        print(f"🚚 {total} points à migrer")
+        copied = 0
+        batch = []
+        async for doc in source.find(query).sort("_id", 1):
+            batch.append(dict(history_store.to_timeseries(doc), _id=doc["_id"]))
+            if len(batch) >= BATCH_SIZE:
+                # Insertion ordonnée : après une interruption, la cible contient un préfixe de la source
+                await target.insert_many(batch)
+                copied += len(batch)
+                batch = []
+                print(f"   {copied}/{total}")
+        if batch:
+            await target.insert_many(batch)
+            copied += len(batch)
+        print(f"✅ {copied} points migrés")
+
+        if drop_legacy:
+            await source.drop()
+            print(f"🗑️  {LEGACY} supprimée")
+        else:
+            print(f"ℹ️  {LEGACY} conservée (relancer avec --drop-legacy pour la supprimer)")
+        print("ℹ️  Activez LOCATION_HISTORY_TIMESERIES=1 dans .env puis redémarrez le serveur")
+        return True
+
+    except Exception as e:
+        print(f"❌ Erreur: {e}")
+        return False
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    result = asyncio.run(migrate(drop_legacy="--drop-legacy" in sys.argv[1:]))
+    sys.exit(0 if result else 1)
@@ -0,0 +1,68 @@
+"""Keyset pagination and NDJSON streaming over Motor cursors.
+
+A page is read with a range condition on the sort keys of the last document
+returned, never with skip(), so every page costs the same index seek. The
+cursor handed to clients is that document's sort key values, encoded as
+opaque URL-safe base64.
+"""
+import base64
+from typing import AsyncIterator, Callable, List, Optional, Tuple
+
+from bson import json_util
+from pymongo import ASCENDING
+
+from serialization import dumps
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_BATCH_SIZE = 500
+
+
+def encode_cursor(doc: dict, sort: List[Tuple[str, int]]) -> str:
+    values = json_util.dumps([doc.get(field) for field, _ in sort])
+    return base64.urlsafe_b64encode(values.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, sort: List[Tuple[str, int]]) -> list:
+    """Sort key values of a cursor; ValueError when it was not issued for this sort"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json_util.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError("malformed cursor") from e
+    if not isinstance(values, list) or len(values) != len(sort):
+        raise ValueError("malformed cursor")
+    return values
+
+
+def after(sort: List[Tuple[str, int]], values: list) -> dict:
+    """Filter matching the documents that come after `values` in `sort` order"""
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {f: v for (f, _), v in zip(sort[:i], values[:i])}
+        clause[field] = {"$gt" if direction == ASCENDING else "$lt": values[i]}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+
+async def fetch_page(collection, query: dict, sort: List[Tuple[str, int]], limit: int,
+                     cursor: Optional[str] = None, projection: Optional[dict] = None) -> Tuple[list, Optional[str]]:
+    """One page of documents and the cursor of the next page, None on the last one"""
+    if cursor:
+        query = {"$and": [query, after(sort, decode_cursor(cursor, sort))]}
+    docs = await collection.find(query, projection).sort(sort).limit(limit + 1).to_list(limit + 1)
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    return docs, encode_cursor(docs[-1], sort)
+
+
+async def stream_ndjson(collection, query: dict, sort: List[Tuple[str, int]],
+                        transform: Callable[[dict], dict], projection: Optional[dict] = None,
+                        batch_size: int = STREAM_BATCH_SIZE) -> AsyncIterator[bytes]:
+    """Every matching document as one JSON line, written a cursor batch at a time"""
+    cursor = collection.find(query, projection).sort(sort).batch_size(batch_size)
+    while True:
+        docs = await cursor.to_list(batch_size)
+        if not docs:
+            break
+        yield b"".join(dumps(transform(doc)) + b"\n" for doc in docs)
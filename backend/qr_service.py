@@ -0,0 +1,116 @@
+"""QR code rendering off the event loop, cached by payload."""
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+
+import qrcode
+
+logger = logging.getLogger(__name__)
+
+
+def delivery_qr_data(delivery: dict) -> dict:
+    """Content of a delivery QR code, from a stored or an already serialized delivery"""
+    scheduled_time = delivery.get('scheduled_time')
+    return {
+        "delivery_id": delivery.get('id'),
+        "route_id": delivery.get('route_id'),
+        "scheduled_time": scheduled_time.isoformat() if isinstance(scheduled_time, datetime) else scheduled_time
+    }
+
+
+def qr_payload(data: dict) -> str:
+    """Text encoded in a delivery QR code"""
+    return json.dumps(data)
+
+
+def render_png(payload: str) -> bytes:
+    """Encode `payload` as a QR code PNG; runs in the worker processes"""
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="black", back_color="white")
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class QRService:
+    """Renders QR PNGs in a process pool, keeping recent images by payload hash.
+
+    The SHA-256 of the payload is both the cache key and the image ETag.
+    Concurrent requests for the same payload share one render. With
+    `workers=0` rendering runs in the default thread pool instead.
+    """
+
+    def __init__(self, workers: int = 2, cache_size: int = 1024):
+        self.workers = workers
+        self.cache_size = cache_size
+        self.cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.executor: Optional[Executor] = None
+        self.hits = 0
+        self.renders = 0
+
+    def start(self):
+        if self.executor is None and self.workers > 0:
+            # spawn: forking a process that already runs the event loop and Motor threads is unsafe
+            self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def stop(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    @staticmethod
+    def etag(payload: str) -> str:
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def cached(self, key: str) -> Optional[bytes]:
+        image = self.cache.get(key)
+        if image is not None:
+            self.cache.move_to_end(key)
+            self.hits += 1
+        return image
+
+    def remember(self, key: str, image: bytes):
+        self.cache[key] = image
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    async def png(self, data: dict) -> Tuple[str, bytes]:
+        """ETag and PNG bytes of the QR code for `data`"""
+        payload = qr_payload(data)
+        key = self.etag(payload)
+        image = self.cached(key)
+        if image is not None:
+            return key, image
+        future = self.inflight.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self.inflight[key] = loop.run_in_executor(self.executor, render_png, payload)
+            future.add_done_callback(lambda f: self._rendered(key, f))
+        return key, await asyncio.shield(future)
+
+    def _rendered(self, key: str, future: asyncio.Future):
+        self.inflight.pop(key, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        self.renders += 1
+        self.remember(key, future.result())
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "cached": len(self.cache),
+            "inflight": len(self.inflight),
+            "hits": self.hits,
+            "renders": self.renders,
+        }
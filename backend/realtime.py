@@ -0,0 +1,327 @@
+"""Active-driver state and admin fan-out shared by the uvicorn workers.
+
+LocalBackend keeps everything in the process, which is all a single worker
+needs. SocketBackend lets the workers of one host share it: the worker that
+holds an flock on `<path>.lock` serves a Unix socket hub and the others
+connect to it. Every worker keeps a full replica of the driver state, so
+reads never leave the process; writes and published messages go through
+the hub, which relays them to the other workers. When the hub worker exits
+its lock is released and another worker takes over.
+
+Published messages are delivered to the local subscribers first, then to
+the other workers; they must be JSON-serializable. With `local=False` only
+the other workers receive them, for changes this worker already applied.
+"""
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+import asyncio
+import logging
+import os
+
+import orjson
+
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+# Published when a driver goes away, also by the hub for the drivers of a worker that exited
+DRIVER_REMOVED = "driver_removed"
+
+Handler = Callable[[str, dict], Awaitable[None]]
+
+# Largest frame on the hub socket (a full state sync)
+MAX_FRAME = 64 * 1024 * 1024
+# Output buffered for a worker that stopped reading before it is dropped; it resyncs on reconnect
+MAX_PEER_BUFFER = 16 * 1024 * 1024
+RECONNECT_DELAY = 0.1
+# Time given to the workers to reclaim their drivers from a new hub
+ADOPT_GRACE = 2.0
+
+
+class LocalBackend:
+    """Driver state and pub/sub for a single process"""
+
+    name = "local"
+
+    def __init__(self):
+        self.drivers: Dict[str, dict] = {}
+        self.handlers: List[Handler] = []
+        self.published = 0
+        self.delivered = 0
+
+    def subscribe(self, handler: Handler):
+        self.handlers.append(handler)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def set_driver(self, driver_id: str, data: dict):
+        self.drivers[driver_id] = data
+
+    def remove_driver(self, driver_id: str):
+        self.drivers.pop(driver_id, None)
+
+    async def publish(self, channel: str, message: dict, local: bool = True):
+        self.published += 1
+        if local:
+            await self.deliver(channel, message)
+
+    async def deliver(self, channel: str, message: dict):
+        self.delivered += 1
+        for handler in self.handlers:
+            try:
+                await handler(channel, message)
+            except Exception as e:
+                logger.error(f"Realtime handler failed on {channel}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "pid": os.getpid(),
+            "drivers": len(self.drivers),
+            "published": self.published,
+            "delivered": self.delivered,
+        }
+
+
+def encode(message: dict) -> bytes:
+    return dumps(message) + b"\n"
+
+
+class SocketBackend(LocalBackend):
+    """Driver state and pub/sub shared by the processes of one host over a Unix socket.
+
+    Frames are newline-delimited JSON: `set`/`del` for driver state, `pub`
+    for a published message, and `sync`, the full state sent by the hub to
+    a worker that connects. Drivers are owned by the worker that set them:
+    a worker re-announces its own drivers after reconnecting, and the hub
+    removes those of a worker whose connection closed.
+    """
+
+    name = "socket"
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self.is_hub = False
+        self.owned: Set[str] = set()
+        self.ready = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.lock_file = None
+        # Worker side
+        self.writer: Optional[asyncio.StreamWriter] = None
+        # Hub side
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.peers: Set[asyncio.StreamWriter] = set()
+        self.owners: Dict[str, asyncio.StreamWriter] = {}
+        self.relayed = 0
+        self.reconnects = 0
+        self.dropped_peers = 0
+
+    async def start(self, timeout: float = 10):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Realtime hub {self.path} unreachable, running on local state until it answers")
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if self.server is not None:
+            self.server.close()
+            for peer in list(self.peers):
+                peer.close()
+            self.peers.clear()
+            self.server = None
+        if self.lock_file is not None:
+            # Closing the file releases the lock for the next hub
+            self.lock_file.close()
+            self.lock_file = None
+        self.is_hub = False
+        self.ready.clear()
+
+    def set_driver(self, driver_id: str, data: dict):
+        self.drivers[driver_id] = data
+        self.owned.add(driver_id)
+        self.owners.pop(driver_id, None)
+        self._send({"op": "set", "id": driver_id, "data": data})
+
+    def remove_driver(self, driver_id: str):
+        self.drivers.pop(driver_id, None)
+        self.owned.discard(driver_id)
+        self.owners.pop(driver_id, None)
+        self._send({"op": "del", "id": driver_id})
+
+    async def publish(self, channel: str, message: dict, local: bool = True):
+        self.published += 1
+        self._send({"op": "pub", "channel": channel, "message": message})
+        if local:
+            await self.deliver(channel, message)
+
+    def _send(self, frame: dict):
+        if self.is_hub:
+            self._relay(encode(frame))
+        elif self.writer is not None:
+            self.writer.write(encode(frame))
+
+    async def _run(self):
+        while True:
+            if self._acquire_lock():
+                await self._serve()
+                return
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path, limit=MAX_FRAME)
+            except OSError:
+                # The hub is starting, or its worker just exited and the lock is about to be free
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+            try:
+                await self._follow(reader, writer)
+            except (OSError, ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError) as e:
+                logger.warning(f"Realtime hub connection lost: {e}")
+            finally:
+                self.writer = None
+                self.ready.clear()
+                writer.close()
+            self.reconnects += 1
+
+    def _acquire_lock(self) -> bool:
+        import fcntl
+
+        lock_file = open(self.path + ".lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self.lock_file = lock_file
+        return True
+
+    # Worker side
+
+    async def _follow(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        sync = orjson.loads(await reader.readuntil(b"\n"))
+        drivers = sync["drivers"]
+        # Ours are announced again; the hub publishes the removal of any driver left behind
+        own = {d: self.drivers[d] for d in self.owned if d in self.drivers}
+        self.drivers.clear()
+        self.drivers.update(drivers)
+        self.drivers.update(own)
+        self.writer = writer
+        for driver_id, data in own.items():
+            writer.write(encode({"op": "set", "id": driver_id, "data": data}))
+        self.ready.set()
+        logger.info(f"Realtime: connected to hub {self.path}")
+
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            frame = orjson.loads(line)
+            op = frame["op"]
+            if op == "set":
+                self.drivers[frame["id"]] = frame["data"]
+            elif op == "del":
+                self.drivers.pop(frame["id"], None)
+            elif op == "pub":
+                await self.deliver(frame["channel"], frame["message"])
+
+    # Hub side
+
+    async def _serve(self):
+        # We hold the lock, so an existing socket file was left by a previous hub
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = await asyncio.start_unix_server(self._peer, path=self.path, limit=MAX_FRAME)
+        self.is_hub = True
+        self.owners.clear()
+        self.ready.set()
+        logger.info(f"Realtime: serving hub on {self.path} (pid {os.getpid()})")
+        # The other workers reclaim their drivers as they reconnect; those still
+        # unclaimed after the grace period left with the previous hub's worker
+        await asyncio.sleep(ADOPT_GRACE)
+        for driver_id in [d for d in self.drivers if d not in self.owned and d not in self.owners]:
+            await self._drop(driver_id)
+        await asyncio.Event().wait()
+
+    async def _drop(self, driver_id: str):
+        self.drivers.pop(driver_id, None)
+        self._send({"op": "del", "id": driver_id})
+        await self.publish(DRIVER_REMOVED, {"driver_id": driver_id})
+
+    def _relay(self, line: bytes, source: Optional[asyncio.StreamWriter] = None):
+        for peer in list(self.peers):
+            if peer is source:
+                continue
+            if peer.transport.get_write_buffer_size() > MAX_PEER_BUFFER:
+                self.dropped_peers += 1
+                logger.warning("Realtime: worker too slow, dropping its hub connection")
+                self.peers.discard(peer)
+                peer.close()
+                continue
+            peer.write(line)
+        self.relayed += 1
+
+    async def _peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        writer.write(encode({"op": "sync", "drivers": self.drivers}))
+        self.peers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                frame = orjson.loads(line)
+                op = frame["op"]
+                if op == "set":
+                    self.drivers[frame["id"]] = frame["data"]
+                    self.owners[frame["id"]] = writer
+                    self.owned.discard(frame["id"])
+                elif op == "del":
+                    self.drivers.pop(frame["id"], None)
+                    self.owners.pop(frame["id"], None)
+                self._relay(line, writer)
+                if op == "pub":
+                    await self.deliver(frame["channel"], frame["message"])
+        except (OSError, ValueError, asyncio.LimitOverrunError) as e:
+            logger.warning(f"Realtime: worker connection failed: {e}")
+        finally:
+            self.peers.discard(writer)
+            writer.close()
+            if self.is_hub:
+                # The worker exited with its drivers
+                for driver_id in [d for d, owner in self.owners.items() if owner is writer]:
+                    del self.owners[driver_id]
+                    await self._drop(driver_id)
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats.update({
+            "path": self.path,
+            "role": "hub" if self.is_hub else ("worker" if self.writer is not None else "disconnected"),
+            "owned": len(self.owned),
+            "peers": len(self.peers),
+            "relayed": self.relayed,
+            "reconnects": self.reconnects,
+            "dropped_peers": self.dropped_peers,
+        })
+        return stats
+
+
+def create_backend(name: str, path: str) -> LocalBackend:
+    if name == LocalBackend.name:
+        return LocalBackend()
+    if name == SocketBackend.name:
+        return SocketBackend(path)
+    raise ValueError(f"Unknown realtime backend: {name}")
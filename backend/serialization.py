@@ -0,0 +1,37 @@
+"""Single-pass JSON encoding of MongoDB documents for the hot list endpoints.
+
+orjson encodes datetimes natively (same ISO format as datetime.isoformat()
+for the naive UTC values stored here) and ObjectIds through `_default`, so a
+document only needs its top-level `_id` dropped before being written out.
+The resulting bytes are returned as-is, bypassing FastAPI's jsonable_encoder.
+"""
+from typing import Any, Dict, Optional
+
+import orjson
+from bson import ObjectId
+from fastapi import Response
+
+
+def _default(value: Any):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=_default)
+
+
+def prepare_doc(doc: dict) -> dict:
+    """Drop the Mongo `_id`; everything else is encoded by dumps()"""
+    doc.pop('_id', None)
+    return doc
+
+
+def json_response(obj: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    return Response(content=dumps(obj), media_type="application/json", headers=headers)
+
+
+def raw_json_response(content: bytes, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Response for a body already encoded with dumps()"""
+    return Response(content=content, media_type="application/json", headers=headers)
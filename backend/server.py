@@ -1,20 +1,37 @@
-from fastapi import FastAPI, APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, APIRouter, HTTPException, WebSocket, WebSocketDisconnect, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, ValidationError
+from typing import List, Optional, Dict, Any, Tuple
 import uuid
 from datetime import datetime, timedelta
-import qrcode
-import io
-import base64
 import json
+import base64
 import asyncio
+import struct
+import math
+import time
+from collections import Counter, OrderedDict, deque
 from bson import ObjectId
+from geo import RoutePolyline, SpeedProfile, route_points, simplify
+from spatial import PointIndex
+from geofence import GeofenceEngine
+from alerting import AlertPolicy, AlertSuppressor, OPEN, CLOSE
+from write_behind import WriteBehindBuffer
+from dashboard import DashboardCounters
+from indexes import apply_indexes
+from pagination import NDJSON_MEDIA_TYPE, fetch_page, stream_ndjson
+from qr_service import QRService, delivery_qr_data, qr_payload
+from realtime import DRIVER_REMOVED, create_backend
+from serialization import dumps, json_response, prepare_doc, raw_json_response
+import history_store
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -54,6 +71,28 @@ def serialize_doc(doc):
         return result
     return doc
 
+async def list_documents(collection, query: dict, sort: list, limit: int, cursor: Optional[str],
+                         format: str, transform=prepare_doc, projection: Optional[dict] = None,
+                         extend=None) -> Response:
+    """Keyset-paginated list, or every matching document streamed as NDJSON with format=ndjson.
+
+    The page is encoded in one orjson pass and returned as raw bytes; the
+    cursor of the next page is returned in the X-Next-Cursor header.
+    `extend` is an optional coroutine completing the page documents.
+    """
+    if format == "ndjson":
+        return StreamingResponse(stream_ndjson(collection, query, sort, transform, projection), media_type=NDJSON_MEDIA_TYPE)
+    if format != "json":
+        raise HTTPException(status_code=400, detail="Format inconnu (json ou ndjson)")
+    try:
+        docs, next_cursor = await fetch_page(collection, query, sort, limit, cursor, projection)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+    docs = [transform(d) for d in docs]
+    if extend:
+        docs = await extend(docs)
+    return json_response(docs, {"X-Next-Cursor": next_cursor} if next_cursor else None)
+
 # Create the main app
 app = FastAPI(title="SiteTrack - Suivi de Livreurs")
 
@@ -64,21 +103,101 @@ api_router = APIRouter(prefix="/api")
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Outbound queue per admin socket; a slow dashboard either loses its oldest
+# frames (drop_oldest) or gets disconnected (disconnect) once the queue is full
+ADMIN_QUEUE_SIZE = int(os.environ.get('ADMIN_QUEUE_SIZE', 1000))
+ADMIN_SLOW_CONSUMER = os.environ.get('ADMIN_SLOW_CONSUMER', 'drop_oldest')
+
+# Rate of batched location frames sent to admins; 0 sends every location_update immediately
+ADMIN_BROADCAST_HZ = float(os.environ.get('ADMIN_BROADCAST_HZ', 0))
+
+# Admin protocol versions: 1 sends full driver dicts, 2 sends a sequenced
+# snapshot followed by per-driver field deltas
+ADMIN_PROTOCOLS = (1, 2)
+
+class AdminConnection:
+    """Admin socket drained by its own writer task from a bounded queue"""
+
+    def __init__(self, websocket: WebSocket, protocol: int = 1,
+                 max_queue: int = ADMIN_QUEUE_SIZE, policy: str = ADMIN_SLOW_CONSUMER):
+        self.websocket = websocket
+        self.protocol = protocol
+        self.max_queue = max_queue
+        self.policy = policy
+        self.queue: deque = deque()
+        self.ready = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.connected_at = datetime.utcnow()
+        self.sent = 0
+        self.dropped = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+
+    def enqueue(self, message: dict) -> bool:
+        """Queue a frame; False when the consumer is too slow and must be dropped"""
+        if len(self.queue) >= self.max_queue:
+            if self.policy == 'disconnect':
+                return False
+            self.queue.popleft()
+            self.dropped += 1
+        self.queue.append((time.monotonic(), message))
+        self.ready.set()
+        return True
+
+    def discard(self, *types: str):
+        """Drop the queued frames of the given types"""
+        self.queue = deque(item for item in self.queue if item[1].get('type') not in types)
+
+    async def run(self):
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            while self.queue:
+                queued_at, message = self.queue.popleft()
+                await self.websocket.send_json(message)
+                self.sent += 1
+                self.last_lag_ms = (time.monotonic() - queued_at) * 1000
+                self.max_lag_ms = max(self.max_lag_ms, self.last_lag_ms)
+
+    def stats(self) -> dict:
+        return {
+            "connected_at": self.connected_at.isoformat(),
+            "protocol": self.protocol,
+            "queue_depth": len(self.queue),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "last_lag_ms": round(self.last_lag_ms, 3),
+            "max_lag_ms": round(self.max_lag_ms, 3),
+        }
+
 # WebSocket connection manager
 class ConnectionManager:
     def __init__(self):
         self.active_connections: Dict[str, WebSocket] = {}
-        self.admin_connections: List[WebSocket] = []
+        self.admin_connections: Dict[WebSocket, AdminConnection] = {}
+        self.slow_disconnects = 0
+        # Latest unsent location per driver, flushed once per tick
+        self.broadcast_hz = ADMIN_BROADCAST_HZ
+        self.pending_locations: Dict[str, dict] = {}
+        self.ticker: Optional[asyncio.Task] = None
+        self.ticks = 0
+        self.coalesced = 0
+        # Driver state as last published to protocol 2 admins, and its sequence number
+        self.delta_state: Dict[str, dict] = {}
+        self.seq = 0
 
     async def connect_driver(self, websocket: WebSocket, driver_id: str):
         await websocket.accept()
         self.active_connections[driver_id] = websocket
         logger.info(f"Driver {driver_id} connected")
 
-    async def connect_admin(self, websocket: WebSocket):
+    async def connect_admin(self, websocket: WebSocket, protocol: int = 1) -> AdminConnection:
         await websocket.accept()
-        self.admin_connections.append(websocket)
+        connection = AdminConnection(websocket, protocol)
+        connection.task = asyncio.create_task(self._write_admin(connection))
+        self.admin_connections[websocket] = connection
         logger.info("Admin connected")
+        return connection
 
     def disconnect_driver(self, driver_id: str):
         if driver_id in self.active_connections:
@@ -86,19 +205,110 @@ class ConnectionManager:
             logger.info(f"Driver {driver_id} disconnected")
 
     def disconnect_admin(self, websocket: WebSocket):
-        if websocket in self.admin_connections:
-            self.admin_connections.remove(websocket)
+        connection = self.admin_connections.pop(websocket, None)
+        if connection:
+            if connection.task and connection.task is not asyncio.current_task():
+                connection.task.cancel()
             logger.info("Admin disconnected")
 
-    async def broadcast_to_admins(self, message: dict):
-        disconnected = []
-        for connection in self.admin_connections:
+    async def _write_admin(self, connection: AdminConnection):
+        try:
+            await connection.run()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Admin writer stopped: {e}")
+            self.disconnect_admin(connection.websocket)
+
+    async def broadcast_to_admins(self, message: dict, protocol: Optional[int] = None):
+        """Queue a frame for every admin (of one protocol) without waiting on any socket"""
+        for websocket, connection in list(self.admin_connections.items()):
+            if protocol is not None and connection.protocol != protocol:
+                continue
+            if not connection.enqueue(message):
+                self.slow_disconnects += 1
+                logger.warning("Admin too slow, disconnecting")
+                self.disconnect_admin(websocket)
+                asyncio.create_task(self._close_quietly(websocket))
+
+    async def broadcast_location(self, driver_data: dict, urgent: bool = False):
+        """Send a driver position, coalesced into the next tick unless urgent"""
+        driver_id = driver_data['driver_id']
+        if urgent or self.broadcast_hz <= 0:
+            self.pending_locations.pop(driver_id, None)
+            await self.broadcast_to_admins({"type": "location_update", "data": driver_data}, protocol=1)
+            await self.broadcast_delta([driver_data])
+            return
+        if driver_id in self.pending_locations:
+            self.coalesced += 1
+        self.pending_locations[driver_id] = driver_data
+
+    async def remove_driver(self, driver_id: str):
+        """Drop a driver's pending position and tell admins it is gone"""
+        self.pending_locations.pop(driver_id, None)
+        await self.broadcast_to_admins({"type": "driver_disconnected", "driver_id": driver_id}, protocol=1)
+        await self.broadcast_delta([], removed=[driver_id])
+
+    async def flush_locations(self):
+        if not self.pending_locations:
+            return
+        batch = list(self.pending_locations.values())
+        self.pending_locations = {}
+        self.ticks += 1
+        await self.broadcast_to_admins({"type": "location_batch", "data": batch}, protocol=1)
+        await self.broadcast_delta(batch)
+
+    async def broadcast_delta(self, updates: List[dict], removed: Optional[List[str]] = None):
+        """Publish changed fields per driver to protocol 2 admins under a new sequence number"""
+        drivers = {}
+        for data in updates:
+            previous = self.delta_state.get(data['driver_id'], {})
+            changed = {k: v for k, v in data.items() if k not in previous or previous[k] != v}
+            self.delta_state[data['driver_id']] = dict(data)
+            if changed:
+                drivers[data['driver_id']] = changed
+        removed = [d for d in removed or [] if self.delta_state.pop(d, None) is not None]
+        if not drivers and not removed:
+            return
+        self.seq += 1
+        frame = {"type": "delta", "seq": self.seq, "drivers": drivers}
+        if removed:
+            frame["removed"] = removed
+        await self.broadcast_to_admins(frame, protocol=2)
+
+    def snapshot(self) -> dict:
+        return {"type": "snapshot", "protocol": 2, "seq": self.seq, "drivers": dict(self.delta_state)}
+
+    def start_ticker(self):
+        if self.broadcast_hz > 0 and self.ticker is None:
+            self.ticker = asyncio.create_task(self._tick())
+
+    async def stop_ticker(self):
+        if self.ticker is not None:
+            self.ticker.cancel()
             try:
-                await connection.send_json(message)
-            except:
-                disconnected.append(connection)
-        for conn in disconnected:
-            self.admin_connections.remove(conn)
+                await self.ticker
+            except asyncio.CancelledError:
+                pass
+            self.ticker = None
+
+    async def _tick(self):
+        loop = asyncio.get_running_loop()
+        interval = 1 / self.broadcast_hz
+        next_tick = loop.time() + interval
+        while True:
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            next_tick += interval
+            try:
+                await self.flush_locations()
+            except Exception as e:
+                logger.error(f"Location tick failed: {e}")
+
+    async def _close_quietly(self, websocket: WebSocket):
+        try:
+            await websocket.close(code=1008)
+        except Exception:
+            pass
 
     async def send_to_driver(self, driver_id: str, message: dict):
         if driver_id in self.active_connections:
@@ -107,6 +317,16 @@ class ConnectionManager:
             except:
                 self.disconnect_driver(driver_id)
 
+    def stats(self) -> dict:
+        return {
+            "drivers": len(self.active_connections),
+            "admins": [c.stats() for c in self.admin_connections.values()],
+            "slow_disconnects": self.slow_disconnects,
+            "broadcast_hz": self.broadcast_hz,
+            "ticks": self.ticks,
+            "coalesced_locations": self.coalesced,
+        }
+
 manager = ConnectionManager()
 
 # ============== MODELS ==============
@@ -145,7 +365,7 @@ class Route(BaseModel):
     waypoints: List[Dict[str, float]]  # [{lat, lng, name, order}]
     destination: Dict[str, Any]  # {lat, lng, name, type}
     vehicle_types: List[str] = ["truck", "van", "car"]
-    speed_limits: List[Dict[str, Any]] = []  # [{start, end, limit}]
+    speed_limits: List[Dict[str, Any]] = []  # [{start, end, limit, vehicle_limits?}], start/end in km along the route
     danger_zones: List[Dict[str, Any]] = []  # [{lat, lng, radius, description}]
     restricted_zones: List[Dict[str, Any]] = []
     estimated_time: int = 10  # minutes
@@ -191,6 +411,22 @@ class DeliveryCreate(BaseModel):
     vehicle_type: Optional[str] = None
     license_plate: Optional[str] = None
 
+class BulkDeliveryCreate(BaseModel):
+    # Items are validated one by one so that a bad row fails alone
+    deliveries: List[Dict[str, Any]]
+    ordered: bool = False  # stop at the first failing item, like an ordered insert_many
+
+class BulkStatusUpdate(BaseModel):
+    delivery_ids: List[str]
+    status: str
+
+class DeliveryAssignment(BaseModel):
+    delivery_id: str
+    driver_id: str
+
+class BulkAssignment(BaseModel):
+    assignments: List[DeliveryAssignment]
+
 class LocationUpdate(BaseModel):
     driver_id: str
     delivery_id: str
@@ -200,6 +436,35 @@ class LocationUpdate(BaseModel):
     heading: Optional[float] = 0
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
+# Binary location frame, little-endian: delivery slot (uint16), latitude,
+# longitude (float64), speed km/h, heading degrees (float32), unix time (float64).
+# Slots are handed out per connection by the start_trip handshake.
+LOCATION_FRAME = struct.Struct('<Hddffd')
+
+# Latest unix time a frame may carry (datetime.max is year 9999)
+MAX_FRAME_TIMESTAMP = 253402300799
+
+def decode_location_frame(driver_id: str, frame: bytes, slots: List[str]) -> Optional[LocationUpdate]:
+    """Build a LocationUpdate straight from a binary frame (None if malformed)"""
+    if len(frame) != LOCATION_FRAME.size:
+        return None
+    slot, latitude, longitude, speed, heading, timestamp = LOCATION_FRAME.unpack(frame)
+    if slot >= len(slots):
+        return None
+    if not all(math.isfinite(v) for v in (latitude, longitude, speed, heading, timestamp)):
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180 and timestamp <= MAX_FRAME_TIMESTAMP):
+        return None
+    return LocationUpdate(
+        driver_id=driver_id,
+        delivery_id=slots[slot],
+        latitude=latitude,
+        longitude=longitude,
+        speed=speed,
+        heading=heading,
+        timestamp=datetime.utcfromtimestamp(timestamp) if timestamp > 0 else datetime.utcnow()
+    )
+
 class ActiveDriver(BaseModel):
     driver_id: str
     driver_name: str
@@ -228,7 +493,11 @@ class Alert(BaseModel):
     longitude: float
     severity: str = "medium"  # low, medium, high, critical
     is_resolved: bool = False
+    is_open: bool = True  # condition still observed on incoming pings
+    count: int = 1
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    last_seen: datetime = Field(default_factory=datetime.utcnow)
+    closed_at: Optional[datetime] = None
     resolved_at: Optional[datetime] = None
 
 class Camera(BaseModel):
@@ -239,6 +508,9 @@ class Camera(BaseModel):
     stream_url: Optional[str] = None
     is_active: bool = True
 
+class PointsQuery(BaseModel):
+    points: List[Dict[str, float]]  # [{lat, lng}]
+
 # ============== INFRASTRUCTURES DE VERSAILLES ==============
 
 # Centre de Versailles (Place d'Armes)
@@ -619,38 +891,449 @@ DEMO_CAMERAS = [
     {"id": "cam-marche", "name": "Caméra Marché Notre-Dame", "location": {"lat": 48.8055, "lng": 2.1220}, "zone": "Marché", "is_active": True},
 ]
 
-# In-memory active drivers store (for real-time tracking)
-active_drivers: Dict[str, dict] = {}
+# Active driver state and admin broadcasts, shared by the uvicorn workers with
+# REALTIME_BACKEND=socket (workers of one host, see realtime.py)
+REALTIME_BACKEND = os.environ.get('REALTIME_BACKEND', 'local')
+REALTIME_SOCKET = os.environ.get('REALTIME_SOCKET', '/tmp/sitetrack-realtime.sock')
+realtime = create_backend(REALTIME_BACKEND, REALTIME_SOCKET)
+
+# In-memory active drivers store (for real-time tracking): this worker's
+# replica, written through realtime.set_driver / remove_driver only
+active_drivers: Dict[str, dict] = realtime.drivers
+
+# Published channels, fanned out by every worker to its own sockets
+LOCATION_CHANNEL = "location"
+ADMIN_CHANNEL = "admins"
+DRIVER_MESSAGE_CHANNEL = "driver_message"
+# Changes already applied by the worker that made them, for the other workers'
+# route cache, driver sessions, trajectories and dashboard counters
+ROUTE_CHANNEL = "route_changed"
+DELIVERY_CHANNEL = "delivery_changed"
+ALERT_CHANNEL = "alert_changed"
+
+async def share_route_change(route_id: str):
+    await realtime.publish(ROUTE_CHANNEL, {"route_id": route_id}, local=False)
+
+async def share_delivery_changes(delivery_ids, dashboard: Optional[Counter] = None):
+    await realtime.publish(DELIVERY_CHANNEL, {
+        "delivery_ids": list(delivery_ids),
+        "dashboard": {k: v for k, v in (dashboard or {}).items() if v}
+    }, local=False)
+
+async def share_alert_change(dashboard: Counter, alert_id: Optional[str] = None):
+    await realtime.publish(ALERT_CHANNEL, {
+        "alert_id": alert_id,
+        "dashboard": {k: v for k, v in dashboard.items() if v}
+    }, local=False)
+
+async def on_realtime_message(channel: str, message: dict):
+    if channel == LOCATION_CHANNEL:
+        await manager.broadcast_location(message['data'], urgent=message['urgent'])
+    elif channel == DRIVER_REMOVED:
+        await manager.remove_driver(message['driver_id'])
+    elif channel == ADMIN_CHANNEL:
+        await manager.broadcast_to_admins(message)
+    elif channel == DRIVER_MESSAGE_CHANNEL:
+        # Only the worker holding the driver socket sends it
+        await manager.send_to_driver(message['driver_id'], message['message'])
+    elif channel == ROUTE_CHANNEL:
+        await route_cache.refresh(message['route_id'])
+    elif channel == DELIVERY_CHANNEL:
+        dashboard_counters.merge(message['dashboard'])
+        for delivery_id in message['delivery_ids']:
+            trajectory_cache.invalidate(delivery_id)
+        await driver_sessions.refresh_many(set(message['delivery_ids']))
+    elif channel == ALERT_CHANNEL:
+        dashboard_counters.merge(message['dashboard'])
+        if message['alert_id']:
+            alert_suppressor.discard(message['alert_id'])
+
+realtime.subscribe(on_realtime_message)
+
+# ============== ROUTE CACHE ==============
+
+class RouteCache:
+    """Process-wide cache of route documents keyed by route id.
+
+    Loaded from db.routes and DEMO_ROUTES at startup and kept up to date by the
+    route endpoints, so the location hot path never waits on a route lookup.
+    """
+
+    def __init__(self):
+        self.routes: Dict[str, dict] = {r['id']: r for r in DEMO_ROUTES}
+        self.polylines: Dict[str, Optional[RoutePolyline]] = {}
+        self.speed_profiles: Dict[str, SpeedProfile] = {}
+        self.hits = 0
+        self.misses = 0
+        self.loaded_at: Optional[datetime] = None
+        # Bumped on every change so derived indexes know when to rebuild
+        self.version = 0
+
+    async def load(self):
+        routes = {r['id']: r for r in DEMO_ROUTES}
+        if db is not None:
+            async for route in db.routes.find({}):
+                routes[route['id']] = route
+        self.routes = routes
+        self.polylines = {}
+        self.speed_profiles = {}
+        self.version += 1
+        self.loaded_at = datetime.utcnow()
+        logger.info(f"Route cache loaded ({len(routes)} routes)")
+
+    def get(self, route_id: Optional[str]) -> Optional[dict]:
+        route = self.routes.get(route_id) if route_id else None
+        if route is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return route
+
+    async def fetch(self, route_id: Optional[str]) -> Optional[dict]:
+        """Cached lookup falling back to MongoDB for routes created elsewhere"""
+        route = self.get(route_id)
+        if route is None and route_id and db is not None:
+            route = await db.routes.find_one({"id": route_id})
+            if route:
+                self.routes[route_id] = route
+        return route
+
+    async def fetch_many(self, route_ids) -> Dict[str, dict]:
+        """Cached lookups for many routes, the missing ones read with a single $in query"""
+        found = {}
+        missing = []
+        for route_id in set(route_ids):
+            route = self.get(route_id)
+            if route is None:
+                missing.append(route_id)
+            else:
+                found[route_id] = route
+        if missing and db is not None:
+            async for route in db.routes.find({"id": {"$in": missing}}):
+                self.routes[route['id']] = found[route['id']] = route
+        return found
+
+    # Derived structures are built from the cached document only, never from a
+    # caller's copy that may predate the last update
+
+    def polyline(self, route_id: str) -> Optional[RoutePolyline]:
+        """Projected geometry of a route, built on first use (None without any point)"""
+        if route_id not in self.polylines:
+            route = self.routes.get(route_id)
+            if route is None:
+                return None
+            points = route_points(route)
+            self.polylines[route_id] = RoutePolyline(points) if points else None
+        return self.polylines[route_id]
+
+    def speed_profile(self, route_id: str) -> SpeedProfile:
+        """Speed-limit intervals of a route indexed by distance, built on first use"""
+        if route_id not in self.speed_profiles:
+            route = self.routes.get(route_id)
+            if route is None:
+                return SpeedProfile([], DEFAULT_SPEED_LIMIT)
+            self.speed_profiles[route_id] = SpeedProfile(route.get('speed_limits') or [], DEFAULT_SPEED_LIMIT)
+        return self.speed_profiles[route_id]
+
+    def put(self, route: dict):
+        self.routes[route['id']] = route
+        self.polylines.pop(route['id'], None)
+        self.speed_profiles.pop(route['id'], None)
+        self.version += 1
+
+    async def refresh(self, route_id: str):
+        route = await db.routes.find_one({"id": route_id})
+        if route:
+            self.put(route)
+        else:
+            self.invalidate(route_id)
+
+    def invalidate(self, route_id: str):
+        self.routes.pop(route_id, None)
+        self.polylines.pop(route_id, None)
+        self.speed_profiles.pop(route_id, None)
+        self.version += 1
+        for r in DEMO_ROUTES:
+            if r['id'] == route_id:
+                self.routes[route_id] = r
+                break
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self.routes),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+        }
+
+route_cache = RouteCache()
+
+# Danger and restricted zones of all active routes, rebuilt from the route cache
+geofences = GeofenceEngine()
+
+def sync_geofences():
+    if geofences.version != route_cache.version:
+        geofences.rebuild(route_cache.routes.values(), route_cache.version)
+
+# ============== CAMERA INDEX ==============
+
+class CameraIndex:
+    """Spatial index over active cameras, rebuilt whenever the camera set changes"""
+
+    def __init__(self):
+        self.cameras: List[dict] = []
+        self.index = PointIndex([], self.locate)
+        self.signature: Optional[tuple] = None
+        self.rebuilds = 0
+
+    @staticmethod
+    def locate(camera: dict):
+        return camera['location']['lat'], camera['location']['lng']
+
+    def sync(self, cameras: List[dict]):
+        signature = tuple(sorted((c['id'],) + self.locate(c) for c in cameras))
+        if signature != self.signature:
+            self.cameras = [serialize_doc(c) for c in cameras]
+            self.index = PointIndex(self.cameras, self.locate)
+            self.signature = signature
+            self.rebuilds += 1
+
+    async def load(self):
+        cameras = await db.cameras.find({"is_active": True}).to_list(None) if db is not None else []
+        self.sync(cameras)
+
+    async def ready(self) -> PointIndex:
+        if self.signature is None:
+            await self.load()
+        return self.index
+
+    def stats(self) -> dict:
+        return {"cameras": len(self.cameras), "rebuilds": self.rebuilds}
+
+camera_index = CameraIndex()
+
+# ============== TRAJECTORY CACHE ==============
+
+class TrajectoryCache:
+    """Encoded simplified histories of completed deliveries, least recently used evicted first"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Optional[bytes]:
+        trajectory = self.entries.get(key)
+        if trajectory is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return trajectory
+
+    def put(self, key: tuple, trajectory: bytes):
+        self.entries[key] = trajectory
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, delivery_id: str):
+        for key in [k for k in self.entries if k[0] == delivery_id]:
+            del self.entries[key]
+
+    def stats(self) -> dict:
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+trajectory_cache = TrajectoryCache(int(os.environ.get('TRAJECTORY_CACHE_SIZE', 256)))
+
+# ============== LOCATION HISTORY BUFFER ==============
+
+# Location pings are written behind the request in batched insert_many calls
+history_buffer = WriteBehindBuffer(
+    "location_history",
+    batch_size=int(os.environ.get('LOCATION_HISTORY_BATCH_SIZE', 500)),
+    flush_interval=float(os.environ.get('LOCATION_HISTORY_FLUSH_INTERVAL', 1.0)),
+    max_pending=int(os.environ.get('LOCATION_HISTORY_MAX_PENDING', 50000)),
+    overflow=os.environ.get('LOCATION_HISTORY_OVERFLOW', 'drop_oldest'),
+)
+
+# Set at startup when LOCATION_HISTORY_TIMESERIES is on and the collection is time-series
+history_timeseries = False
+
+# ============== DASHBOARD COUNTERS ==============
+
+# Maintained by the delivery and alert endpoints, checked against Mongo periodically
+dashboard_counters = DashboardCounters(
+    interval=float(os.environ.get('DASHBOARD_RECONCILE_INTERVAL', 300))
+)
+
+# ============== ALERT SUPPRESSION ==============
+
+# Repeated conditions update one open alert instead of inserting one per ping
+ALERT_OPEN_AFTER = int(os.environ.get('ALERT_OPEN_AFTER', 2))
+ALERT_CLOSE_AFTER = int(os.environ.get('ALERT_CLOSE_AFTER', 3))
+ALERT_COOLDOWN = float(os.environ.get('ALERT_COOLDOWN', 120))
+ALERT_UPDATE_INTERVAL = float(os.environ.get('ALERT_UPDATE_INTERVAL', 30))
+
+alert_suppressor = AlertSuppressor({
+    "deviation": AlertPolicy(ALERT_OPEN_AFTER, ALERT_CLOSE_AFTER, ALERT_COOLDOWN, ALERT_UPDATE_INTERVAL),
+    "speed": AlertPolicy(ALERT_OPEN_AFTER, ALERT_CLOSE_AFTER, ALERT_COOLDOWN, ALERT_UPDATE_INTERVAL),
+    # Zones are fed entry/exit edges by the geofence engine, not per-ping levels
+    "zone_violation": AlertPolicy(1, 1, float(os.environ.get('ALERT_ZONE_COOLDOWN', ALERT_COOLDOWN)), ALERT_UPDATE_INTERVAL),
+})
+
+# ============== DRIVER SESSIONS ==============
+
+class DeliverySession:
+    """Delivery and route context held by a driver socket for the current trip"""
+
+    def __init__(self, driver_id: str):
+        self.driver_id = driver_id
+        self.delivery_id: Optional[str] = None
+        self.delivery: Optional[dict] = None
+        # Resolved through route_cache on every ping, so route updates apply mid-trip
+        self.route_id: Optional[str] = None
+        # Delivery ids addressed by slot number in binary location frames
+        self.slots: List[str] = []
+        # Latest-wins slot between the receive loop and the processing task
+        self.pending: Optional[LocationUpdate] = None
+        self.wakeup = asyncio.Event()
+        self.superseded = 0
+
+    def slot(self, delivery_id: str) -> int:
+        if delivery_id not in self.slots:
+            self.slots.append(delivery_id)
+        return self.slots.index(delivery_id)
+
+    async def load(self, delivery_id: str):
+        self.use(delivery_id, await db.deliveries.find_one({"id": delivery_id}) if delivery_id else None)
+        if self.route_id:
+            # Warms the cache for routes created on another worker
+            await route_cache.fetch(self.route_id)
+
+    def use(self, delivery_id: str, delivery: Optional[dict]):
+        self.delivery_id = delivery_id
+        self.delivery = delivery
+        self.route_id = delivery.get('route_id') if delivery else None
+
+    async def ensure(self, delivery_id: str):
+        """Load the delivery on trip start; later pings for it reuse the session"""
+        if delivery_id != self.delivery_id:
+            await self.load(delivery_id)
+
+    def offer(self, location: LocationUpdate) -> Optional[LocationUpdate]:
+        """Hand a location to the processing task, returning the one it supersedes"""
+        superseded = self.pending
+        self.pending = location
+        self.wakeup.set()
+        if superseded is not None:
+            self.superseded += 1
+        return superseded
+
+    async def take(self) -> LocationUpdate:
+        while self.pending is None:
+            self.wakeup.clear()
+            await self.wakeup.wait()
+        location, self.pending = self.pending, None
+        return location
+
+class SessionRegistry:
+    def __init__(self):
+        self.sessions: Dict[str, DeliverySession] = {}
+        self.closed_superseded = 0
+
+    def open(self, driver_id: str) -> DeliverySession:
+        session = DeliverySession(driver_id)
+        self.sessions[driver_id] = session
+        return session
+
+    def close(self, driver_id: str, session: DeliverySession):
+        self.closed_superseded += session.superseded
+        if self.sessions.get(driver_id) is session:
+            del self.sessions[driver_id]
+
+    async def refresh(self, delivery_id: str):
+        """Reload the context of every session currently tracking this delivery"""
+        await self.refresh_many({delivery_id})
+
+    async def refresh_many(self, delivery_ids):
+        """Reload the sessions tracking any of these deliveries with a single $in query"""
+        sessions = [s for s in self.sessions.values() if s.delivery_id and s.delivery_id in delivery_ids]
+        if not sessions:
+            return
+        ids = list({s.delivery_id for s in sessions})
+        deliveries = {d['id']: d async for d in db.deliveries.find({"id": {"$in": ids}})}
+        for session in sessions:
+            session.use(session.delivery_id, deliveries.get(session.delivery_id))
+        # Warms the cache for routes created on another worker
+        await route_cache.fetch_many(s.route_id for s in sessions if s.route_id)
+
+    def stats(self) -> dict:
+        live = {driver_id: s.superseded for driver_id, s in self.sessions.items()}
+        return {
+            "sessions": len(self.sessions),
+            "superseded_frames": self.closed_superseded + sum(live.values()),
+            "superseded_by_driver": {d: n for d, n in live.items() if n},
+        }
+
+driver_sessions = SessionRegistry()
 
 # ============== HELPER FUNCTIONS ==============
 
-def generate_qr_code(data: dict) -> str:
-    """Generate QR code as base64 string"""
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(json.dumps(data))
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
-    buffer = io.BytesIO()
-    img.save(buffer, format="PNG")
-    return base64.b64encode(buffer.getvalue()).decode()
-
-def calculate_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
-    """Calculate distance in meters between two points"""
-    from math import radians, cos, sin, asin, sqrt
-    R = 6371000  # Earth radius in meters
-    lat1, lng1, lat2, lng2 = map(radians, [lat1, lng1, lat2, lng2])
-    dlat = lat2 - lat1
-    dlng = lng2 - lng1
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlng/2)**2
-    return 2 * R * asin(sqrt(a))
-
-def check_deviation(current_lat: float, current_lng: float, route_waypoints: list, tolerance: float = 100) -> bool:
-    """Check if driver is deviating from route (tolerance in meters)"""
-    for waypoint in route_waypoints:
-        dist = calculate_distance(current_lat, current_lng, waypoint['lat'], waypoint['lng'])
-        if dist < tolerance:
-            return False
-    return True
+# QR codes are rendered in worker processes, never on the event loop
+qr_service = QRService(
+    workers=int(os.environ.get('QR_WORKERS', 2)),
+    cache_size=int(os.environ.get('QR_CACHE_SIZE', 1024))
+)
+
+async def load_delivery_qr_codes(deliveries: List[dict]) -> Dict[str, bytes]:
+    """QR PNGs by delivery id: from memory, then the delivery_qr collection, rendering the rest.
+
+    A stored image is used only while its ETag still matches the delivery content.
+    """
+    images: Dict[str, bytes] = {}
+    keys = {d['id']: QRService.etag(qr_payload(delivery_qr_data(d))) for d in deliveries}
+    for delivery_id, key in keys.items():
+        image = qr_service.cached(key)
+        if image is not None:
+            images[delivery_id] = image
+    missing = [i for i in keys if i not in images]
+    if missing:
+        async for doc in db.delivery_qr.find({"delivery_id": {"$in": missing}}):
+            if doc.get('etag') == keys[doc['delivery_id']]:
+                images[doc['delivery_id']] = bytes(doc['png'])
+                qr_service.remember(doc['etag'], images[doc['delivery_id']])
+    render = {d['id']: d for d in deliveries if d['id'] not in images}
+    if render:
+        # Renders run concurrently in the QR workers, then a single bulk upsert stores them
+        rendered = await asyncio.gather(*(qr_service.png(delivery_qr_data(d)) for d in render.values()))
+        now = datetime.utcnow()
+        operations = []
+        for delivery_id, (key, image) in zip(render, rendered):
+            images[delivery_id] = image
+            operations.append(UpdateOne(
+                {"delivery_id": delivery_id},
+                {"$set": {"etag": key, "png": image, "created_at": now}},
+                upsert=True
+            ))
+        await db.delivery_qr.bulk_write(operations, ordered=False)
+    return images
+
+async def store_delivery_qr(delivery: dict) -> bytes:
+    """Render a delivery QR code and save it in the delivery_qr collection"""
+    key, image = await qr_service.png(delivery_qr_data(delivery))
+    await db.delivery_qr.update_one(
+        {"delivery_id": delivery['id']},
+        {"$set": {"etag": key, "png": image, "created_at": datetime.utcnow()}},
+        upsert=True
+    )
+    return image
+
+DEVIATION_TOLERANCE = 100  # meters from the route polyline
+DEFAULT_SPEED_LIMIT = 30  # km/h where the route defines no limit
 
 # ============== AUTH ROUTES ==============
 
@@ -711,29 +1394,22 @@ async def login(credentials: UserLogin):
 @api_router.get("/routes")
 async def get_routes():
     routes = await db.routes.find({"is_active": True}).to_list(100)
-    if not routes:
-        # Insert demo routes if none exist
-        for route in DEMO_ROUTES:
-            route['created_at'] = datetime.utcnow()
-            await db.routes.insert_one(route)
-        return DEMO_ROUTES
     return [serialize_doc(r) for r in routes]
 
 @api_router.get("/routes/{route_id}")
 async def get_route(route_id: str):
-    route = await db.routes.find_one({"id": route_id})
+    route = await route_cache.fetch(route_id)
     if not route:
-        # Check demo routes
-        for r in DEMO_ROUTES:
-            if r['id'] == route_id:
-                return r
         raise HTTPException(status_code=404, detail="Itinéraire non trouvé")
     return serialize_doc(route)
 
 @api_router.post("/routes", response_model=dict)
 async def create_route(route: RouteCreate):
     route_obj = Route(**route.dict())
-    await db.routes.insert_one(route_obj.dict())
+    route_doc = route_obj.dict()
+    await db.routes.insert_one(route_doc)
+    route_cache.put(route_doc)
+    await share_route_change(route_doc['id'])
     return route_obj.dict()
 
 @api_router.put("/routes/{route_id}")
@@ -741,66 +1417,207 @@ async def update_route(route_id: str, route: RouteCreate):
     result = await db.routes.update_one({"id": route_id}, {"$set": route.dict()})
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Itinéraire non trouvé")
+    await route_cache.refresh(route_id)
+    await share_route_change(route_id)
     return {"success": True}
 
 @api_router.delete("/routes/{route_id}")
 async def delete_route(route_id: str):
     result = await db.routes.update_one({"id": route_id}, {"$set": {"is_active": False}})
+    await route_cache.refresh(route_id)
+    await share_route_change(route_id)
     return {"success": True}
 
 # ============== DELIVERY MANAGEMENT ==============
 
+DELIVERY_SORT = [("created_at", -1), ("id", -1)]
+
+DELIVERY_FIELDS = tuple(Delivery.model_fields)
+
+def delivery_projection(fields: Optional[str]) -> Tuple[Optional[dict], bool]:
+    """Mongo projection for a `fields=` list, and whether the QR image was asked for.
+
+    The QR image lives in delivery_qr; without `fields` every other field is returned.
+    """
+    if not fields:
+        return {"qr_code": 0}, False
+    names = {f.strip() for f in fields.split(',') if f.strip()}
+    unknown = names.difference(DELIVERY_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Champs inconnus: {', '.join(sorted(unknown))}")
+    with_qr = 'qr_code' in names
+    # Sort keys back the pagination cursor; route and schedule make up the QR content
+    names.update(key for key, _ in DELIVERY_SORT)
+    if with_qr:
+        names.update(("route_id", "scheduled_time"))
+    names.discard('qr_code')
+    return {name: 1 for name in names}, with_qr
+
+async def attach_qr_codes(deliveries: List[dict]) -> List[dict]:
+    images = await load_delivery_qr_codes(deliveries)
+    for delivery in deliveries:
+        delivery['qr_code'] = base64.b64encode(images[delivery['id']]).decode()
+    return deliveries
+
 @api_router.get("/deliveries")
-async def get_deliveries(status: Optional[str] = None):
+async def get_deliveries(status: Optional[str] = None,
+                         limit: int = Query(100, ge=1, le=1000), cursor: Optional[str] = None,
+                         format: str = "json", fields: Optional[str] = None):
+    """List deliveries without their QR image unless `fields` asks for qr_code"""
     query = {}
     if status:
         query['status'] = status
-    deliveries = await db.deliveries.find(query).sort("created_at", -1).to_list(100)
-    return [serialize_doc(d) for d in deliveries]
+    projection, with_qr = delivery_projection(fields)
+    if with_qr and format == "ndjson":
+        raise HTTPException(status_code=400, detail="qr_code n'est pas disponible en ndjson")
+    return await list_documents(db.deliveries, query, DELIVERY_SORT, limit, cursor, format,
+                                projection=projection, extend=attach_qr_codes if with_qr else None)
 
 @api_router.get("/deliveries/{delivery_id}")
-async def get_delivery(delivery_id: str):
-    delivery = await db.deliveries.find_one({"id": delivery_id})
+async def get_delivery(delivery_id: str, fields: Optional[str] = None):
+    """Delivery detail, QR image included unless `fields` leaves it out"""
+    projection, with_qr = delivery_projection(fields)
+    if not fields:
+        with_qr = True
+    delivery = await db.deliveries.find_one({"id": delivery_id}, projection)
     if not delivery:
         raise HTTPException(status_code=404, detail="Livraison non trouvée")
-    return serialize_doc(delivery)
+    delivery = serialize_doc(delivery)
+    if with_qr:
+        await attach_qr_codes([delivery])
+    return delivery
 
 @api_router.post("/deliveries", response_model=dict)
 async def create_delivery(delivery: DeliveryCreate):
     # Get route info
-    route = await db.routes.find_one({"id": delivery.route_id})
-    if not route:
-        for r in DEMO_ROUTES:
-            if r['id'] == delivery.route_id:
-                route = r
-                break
+    route = await route_cache.fetch(delivery.route_id)
     
     delivery_obj = Delivery(**delivery.dict())
     if route:
         delivery_obj.route_name = route.get('name', '')
     
-    # Generate QR code
-    qr_data = {
-        "delivery_id": delivery_obj.id,
-        "route_id": delivery_obj.route_id,
-        "scheduled_time": delivery_obj.scheduled_time.isoformat() if delivery_obj.scheduled_time else None
-    }
-    delivery_obj.qr_code = generate_qr_code(qr_data)
+    # The QR image is stored in delivery_qr, not in the delivery document
+    delivery_doc = delivery_obj.dict(exclude={'qr_code'})
+    image = await store_delivery_qr(delivery_doc)
+    delivery_obj.qr_code = base64.b64encode(image).decode()
     
-    await db.deliveries.insert_one(delivery_obj.dict())
+    await db.deliveries.insert_one(delivery_doc)
+    await share_delivery_changes([], dashboard_counters.delivery_changed(None, delivery_doc))
     return delivery_obj.dict()
 
-@api_router.put("/deliveries/{delivery_id}/status")
-async def update_delivery_status(delivery_id: str, status: str):
+BULK_MAX_ITEMS = int(os.environ.get('BULK_MAX_ITEMS', 10000))
+
+def bulk_result(index: int, delivery_id: Optional[str] = None, error: Optional[str] = None) -> dict:
+    if error:
+        return {"index": index, "success": False, "error": error}
+    return {"index": index, "success": True, "id": delivery_id}
+
+def validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error.errors())
+
+@api_router.post("/deliveries/bulk")
+async def create_deliveries_bulk(data: BulkDeliveryCreate):
+    """Create many deliveries at once, reporting success or failure per item"""
+    if len(data.deliveries) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Maximum {BULK_MAX_ITEMS} livraisons par requête")
+    
+    results: List[Optional[dict]] = [None] * len(data.deliveries)
+    items = []
+    for index, raw in enumerate(data.deliveries):
+        try:
+            items.append((index, DeliveryCreate(**raw)))
+        except ValidationError as e:
+            results[index] = bulk_result(index, error=f"Livraison invalide: {validation_message(e)}")
+    
+    # All routes in one lookup
+    routes = await route_cache.fetch_many(item.route_id for _, item in items)
+    docs = []
+    for index, item in items:
+        route = routes.get(item.route_id)
+        if route is None:
+            results[index] = bulk_result(index, error="Itinéraire non trouvé")
+            continue
+        delivery_obj = Delivery(**item.dict(), route_name=route.get('name', ''))
+        docs.append((index, delivery_obj.dict(exclude={'qr_code'})))
+    
+    if data.ordered:
+        failed = [r['index'] for r in results if r is not None]
+        if failed:
+            docs = [(index, doc) for index, doc in docs if index < failed[0]]
+    
+    # QR codes rendered in parallel by the worker processes
+    images = await asyncio.gather(*(qr_service.png(delivery_qr_data(doc)) for _, doc in docs))
+    
+    written = set(range(len(docs)))
+    if docs:
+        try:
+            await db.deliveries.insert_many([doc for _, doc in docs], ordered=data.ordered)
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            for error in errors:
+                results[docs[error['index']][0]] = bulk_result(docs[error['index']][0], error=error.get('errmsg', "Erreur d'écriture"))
+                written.discard(error['index'])
+            if data.ordered and errors:
+                written = {i for i in written if i < errors[0]['index']}
+    
+    qr_docs = []
+    now = datetime.utcnow()
+    dashboard = Counter()
+    for i in sorted(written):
+        index, doc = docs[i]
+        results[index] = bulk_result(index, doc['id'])
+        dashboard.update(dashboard_counters.delivery_changed(None, doc))
+        key, image = images[i]
+        qr_docs.append({"delivery_id": doc['id'], "etag": key, "png": image, "created_at": now})
+    if qr_docs:
+        try:
+            await db.delivery_qr.insert_many(qr_docs, ordered=False)
+        except BulkWriteError as e:
+            # Missing images are rendered again on first read
+            logger.warning(f"Bulk QR storage incomplete: {len(e.details.get('writeErrors', []))} errors")
+    if written:
+        await share_delivery_changes([], dashboard)
+    
+    for index, result in enumerate(results):
+        if result is None:
+            results[index] = bulk_result(index, error="Non traitée: une livraison précédente a échoué")
+    
+    return {
+        "inserted": len(written),
+        "failed": len(results) - len(written),
+        "results": results
+    }
+
+def status_update(status: str) -> dict:
+    """Fields set by a status change: the trip starts or ends with it"""
     update_data = {"status": status}
     if status == "in_progress":
         update_data["start_time"] = datetime.utcnow()
     elif status == "completed":
         update_data["end_time"] = datetime.utcnow()
+    return update_data
+
+def driver_assignment(driver: dict) -> dict:
+    return {
+        "driver_id": driver['id'],
+        "driver_name": driver.get('name', ''),
+        "vehicle_type": driver.get('vehicle_type', ''),
+        "license_plate": driver.get('license_plate', '')
+    }
+
+@api_router.put("/deliveries/{delivery_id}/status")
+async def update_delivery_status(delivery_id: str, status: str):
+    update_data = status_update(status)
     
-    result = await db.deliveries.update_one({"id": delivery_id}, {"$set": update_data})
-    if result.modified_count == 0:
+    before = await db.deliveries.find_one_and_update(
+        {"id": delivery_id}, {"$set": update_data}, return_document=ReturnDocument.BEFORE
+    )
+    if before is None:
         raise HTTPException(status_code=404, detail="Livraison non trouvée")
+    dashboard = dashboard_counters.delivery_changed(before, {**before, **update_data})
+    trajectory_cache.invalidate(delivery_id)
+    await driver_sessions.refresh(delivery_id)
+    await share_delivery_changes([delivery_id], dashboard)
     return {"success": True}
 
 @api_router.post("/deliveries/{delivery_id}/assign")
@@ -809,16 +1626,99 @@ async def assign_delivery(delivery_id: str, driver_id: str):
     if not driver:
         raise HTTPException(status_code=404, detail="Livreur non trouvé")
     
-    update_data = {
-        "driver_id": driver_id,
-        "driver_name": driver.get('name', ''),
-        "vehicle_type": driver.get('vehicle_type', ''),
-        "license_plate": driver.get('license_plate', '')
-    }
+    update_data = driver_assignment(driver)
     
     result = await db.deliveries.update_one({"id": delivery_id}, {"$set": update_data})
+    await driver_sessions.refresh(delivery_id)
+    await share_delivery_changes([delivery_id])
     return {"success": True}
 
+# Bulk variants: one lookup, then a single bulk_write instead of one request per delivery
+
+@api_router.put("/deliveries/status")
+async def update_deliveries_status(data: BulkStatusUpdate):
+    """Apply one status to many deliveries, with the same timestamps as the single update"""
+    if len(data.delivery_ids) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Maximum {BULK_MAX_ITEMS} livraisons par requête")
+    
+    delivery_ids = list(dict.fromkeys(data.delivery_ids))
+    update_data = status_update(data.status)
+    # Previous state of each delivery, for the per-item result and the dashboard deltas
+    before = {}
+    async for doc in db.deliveries.find(
+        {"id": {"$in": delivery_ids}},
+        {"_id": 0, "id": 1, "status": 1, "created_at": 1, "end_time": 1}
+    ):
+        before[doc['id']] = doc
+    
+    if before:
+        await db.deliveries.bulk_write(
+            [UpdateOne({"id": delivery_id}, {"$set": update_data}) for delivery_id in before],
+            ordered=False
+        )
+    
+    results = []
+    dashboard = Counter()
+    for delivery_id in delivery_ids:
+        doc = before.get(delivery_id)
+        if doc is None:
+            results.append({"id": delivery_id, "success": False, "error": "Livraison non trouvée"})
+            continue
+        dashboard.update(dashboard_counters.delivery_changed(doc, {**doc, **update_data}))
+        trajectory_cache.invalidate(delivery_id)
+        results.append({"id": delivery_id, "success": True})
+    await driver_sessions.refresh_many(before.keys())
+    if before:
+        await share_delivery_changes(before.keys(), dashboard)
+    
+    return {
+        "updated": len(before),
+        "failed": len(delivery_ids) - len(before),
+        "results": results
+    }
+
+@api_router.post("/deliveries/assign")
+async def assign_deliveries(data: BulkAssignment):
+    """Assign many deliveries, resolving every driver with a single lookup"""
+    if len(data.assignments) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Maximum {BULK_MAX_ITEMS} livraisons par requête")
+    
+    # The last assignment of a delivery wins
+    assignments = {a.delivery_id: a.driver_id for a in data.assignments}
+    drivers = {}
+    async for driver in db.users.find(
+        {"id": {"$in": list(set(assignments.values()))}},
+        {"_id": 0, "id": 1, "name": 1, "vehicle_type": 1, "license_plate": 1}
+    ):
+        drivers[driver['id']] = driver
+    existing = set()
+    async for doc in db.deliveries.find({"id": {"$in": list(assignments)}}, {"_id": 0, "id": 1}):
+        existing.add(doc['id'])
+    
+    results = []
+    operations = []
+    for delivery_id, driver_id in assignments.items():
+        if delivery_id not in existing:
+            results.append({"id": delivery_id, "success": False, "error": "Livraison non trouvée"})
+        elif driver_id not in drivers:
+            results.append({"id": delivery_id, "success": False, "error": "Livreur non trouvé"})
+        else:
+            operations.append(UpdateOne({"id": delivery_id}, {"$set": driver_assignment(drivers[driver_id])}))
+            results.append({"id": delivery_id, "success": True})
+    
+    if operations:
+        await db.deliveries.bulk_write(operations, ordered=False)
+    assigned = {r['id'] for r in results if r['success']}
+    await driver_sessions.refresh_many(assigned)
+    if assigned:
+        await share_delivery_changes(assigned)
+    
+    return {
+        "updated": len(operations),
+        "failed": len(results) - len(operations),
+        "results": results
+    }
+
 # ============== QR CODE ==============
 
 @api_router.post("/qr/scan")
@@ -836,12 +1736,7 @@ async def scan_qr_code(data: dict):
         if not delivery:
             raise HTTPException(status_code=404, detail="Livraison non trouvée")
         
-        route = await db.routes.find_one({"id": route_id})
-        if not route:
-            for r in DEMO_ROUTES:
-                if r['id'] == route_id:
-                    route = r
-                    break
+        route = await route_cache.fetch(route_id)
         
         return {
             "success": True,
@@ -854,73 +1749,145 @@ async def scan_qr_code(data: dict):
 @api_router.get("/qr/generate/{delivery_id}")
 async def generate_delivery_qr(delivery_id: str):
     """Generate QR code for a delivery"""
-    delivery = await db.deliveries.find_one({"id": delivery_id})
+    delivery = await db.deliveries.find_one({"id": delivery_id}, {"id": 1, "route_id": 1, "scheduled_time": 1})
     if not delivery:
         raise HTTPException(status_code=404, detail="Livraison non trouvée")
     
-    qr_data = {
-        "delivery_id": delivery_id,
-        "route_id": delivery.get('route_id'),
-        "scheduled_time": delivery.get('scheduled_time').isoformat() if delivery.get('scheduled_time') else None
-    }
-    qr_base64 = generate_qr_code(qr_data)
+    images = await load_delivery_qr_codes([delivery])
+    qr_base64 = base64.b64encode(images[delivery_id]).decode()
     return {"qr_code": qr_base64}
 
+@api_router.get("/qr/image/{delivery_id}")
+async def get_delivery_qr_image(delivery_id: str, request: Request):
+    """QR code of a delivery as a PNG image, revalidated with its ETag"""
+    delivery = await db.deliveries.find_one({"id": delivery_id}, {"id": 1, "route_id": 1, "scheduled_time": 1})
+    if not delivery:
+        raise HTTPException(status_code=404, detail="Livraison non trouvée")
+    
+    qr_data = delivery_qr_data(delivery)
+    etag = f'"{QRService.etag(qr_payload(qr_data))}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    images = await load_delivery_qr_codes([delivery])
+    return Response(content=images[delivery_id], media_type="image/png", headers=headers)
+
 # ============== LOCATION TRACKING ==============
 
 @api_router.post("/location/update")
 async def update_location(location: LocationUpdate):
     """Update driver location"""
-    # Store location history
-    await db.location_history.insert_one(location.dict())
-    
     # Get delivery and route info
     delivery = await db.deliveries.find_one({"id": location.delivery_id})
     route = None
     if delivery:
-        route = await db.routes.find_one({"id": delivery.get('route_id')})
-        if not route:
-            for r in DEMO_ROUTES:
-                if r['id'] == delivery.get('route_id'):
-                    route = r
-                    break
+        route = await route_cache.fetch(delivery.get('route_id'))
+    return await process_location(location, delivery, route)
+
+async def record_location_history(location: LocationUpdate):
+    history_doc = location.dict()
+    await history_buffer.put(history_store.to_timeseries(history_doc) if history_timeseries else history_doc)
+
+async def track_alert(location: LocationUpdate, driver_name: str, key: str, active: bool,
+                      message: str = "", severity: str = "medium") -> Optional[dict]:
+    """Feed a condition (keyed by alert type) to the suppressor and write only its transitions.
+
+    Returns the alert when a new one was opened.
+    """
+    event = alert_suppressor.observe(location.driver_id, location.delivery_id, key, active)
+    if event is None:
+        return None
+    action, state = event
+    if action != OPEN:
+        fields = {"count": state.count, "last_seen": state.last_seen, "is_open": action != CLOSE}
+        if action == CLOSE:
+            fields["closed_at"] = state.closed_at
+        result = await db.alerts.update_one({"id": state.alert_id, "is_resolved": False}, {"$set": fields})
+        if result.matched_count or action == CLOSE:
+            return None
+        # Resolved by an admin while the condition persisted: open a fresh alert
+        state.count = 1
+        state.first_seen = state.last_seen
+    alert = Alert(
+        driver_id=location.driver_id,
+        driver_name=driver_name,
+        delivery_id=location.delivery_id,
+        type=key.split(':', 1)[0],
+        message=message,
+        latitude=location.latitude,
+        longitude=location.longitude,
+        severity=severity,
+        count=state.count,
+        created_at=state.first_seen,
+        last_seen=state.last_seen
+    )
+    state.alert_id = alert.id
+    await db.alerts.insert_one(alert.dict())
+    await share_alert_change(dashboard_counters.alert_changed(None, alert.dict()))
+    return serialize_doc(alert.dict())
+
+async def close_driver_alerts(driver_id: str):
+    """Close the alerts still open for a driver that went offline"""
+    now = datetime.utcnow()
+    for state in alert_suppressor.forget(driver_id):
+        await db.alerts.update_one(
+            {"id": state.alert_id},
+            {"$set": {"count": state.count, "last_seen": state.last_seen, "is_open": False, "closed_at": now}}
+        )
+
+async def process_location(location: LocationUpdate, delivery: Optional[dict], route: Optional[dict]) -> dict:
+    """Record a location ping and raise alerts against an already resolved delivery and route"""
+    # Store location history
+    await record_location_history(location)
     
     # Check for deviations and alerts
     alerts = []
     status = "en_route"
+    driver_name = (delivery.get('driver_name') if delivery else None) or 'Inconnu'
     
     if route:
         # Check deviation
-        is_deviating = check_deviation(location.latitude, location.longitude, route.get('waypoints', []))
-        if is_deviating:
+        polyline = route_cache.polyline(route['id'])
+        match = polyline.match(location.latitude, location.longitude) if polyline else None
+        deviating = bool(match and match.distance > DEVIATION_TOLERANCE)
+        if deviating:
             status = "deviation"
-            alert = Alert(
-                driver_id=location.driver_id,
-                driver_name=delivery.get('driver_name', 'Inconnu') if delivery else 'Inconnu',
-                delivery_id=location.delivery_id,
-                type="deviation",
-                message="Déviation de l'itinéraire détectée",
-                latitude=location.latitude,
-                longitude=location.longitude,
-                severity="medium"
-            )
-            await db.alerts.insert_one(alert.dict())
-            alerts.append(alert.dict())
+        alert = await track_alert(
+            location, driver_name, "deviation", deviating,
+            message="Déviation de l'itinéraire détectée",
+            severity="medium"
+        )
+        if alert:
+            alerts.append(alert)
         
-        # Check speed
-        if location.speed and location.speed > 30:  # km/h
-            alert = Alert(
-                driver_id=location.driver_id,
-                driver_name=delivery.get('driver_name', 'Inconnu') if delivery else 'Inconnu',
-                delivery_id=location.delivery_id,
-                type="speed",
-                message=f"Vitesse excessive: {location.speed:.1f} km/h",
-                latitude=location.latitude,
-                longitude=location.longitude,
-                severity="high"
-            )
-            await db.alerts.insert_one(alert.dict())
-            alerts.append(alert.dict())
+        # Check speed against the limit at the driver's distance along the route
+        speed_limit = route_cache.speed_profile(route['id']).limit_at(
+            match.offset if match else None,
+            delivery.get('vehicle_type') if delivery else None
+        )
+        alert = await track_alert(
+            location, driver_name, "speed", bool(location.speed and location.speed > speed_limit),  # km/h
+            message=f"Vitesse excessive: {location.speed or 0:.1f} km/h (limite {speed_limit:g} km/h)",
+            severity="high"
+        )
+        if alert:
+            alerts.append(alert)
+    
+    # Check zones: one alert per entry, and re-entries within the cooldown reuse it
+    sync_geofences()
+    entered, exited = geofences.update(location.driver_id, location.latitude, location.longitude)
+    for zone in exited:
+        await track_alert(location, driver_name, f"zone_violation:{zone['id']}", False)
+    for zone in entered:
+        restricted = zone['kind'] == 'restricted_zones'
+        label = "interdite" if restricted else "dangereuse"
+        alert = await track_alert(
+            location, driver_name, f"zone_violation:{zone['id']}", True,
+            message=f"Entrée en zone {label}: {zone.get('description', '')}".rstrip(': '),
+            severity="high" if restricted else "medium"
+        )
+        if alert:
+            alerts.append(alert)
     
     # Update active drivers
     driver_data = {
@@ -939,36 +1906,75 @@ async def update_location(location: LocationUpdate):
         "last_update": datetime.utcnow().isoformat(),
         "alerts": alerts
     }
-    active_drivers[location.driver_id] = driver_data
+    realtime.set_driver(location.driver_id, driver_data)
     
-    # Broadcast to admins
-    await manager.broadcast_to_admins({
-        "type": "location_update",
-        "data": driver_data
-    })
+    # Broadcast to admins; pings raising alerts skip the tick
+    await realtime.publish(LOCATION_CHANNEL, {"data": driver_data, "urgent": bool(alerts)})
     
     return {"success": True, "alerts": alerts}
 
 @api_router.get("/location/active")
 async def get_active_drivers():
     """Get all active drivers with their current location"""
-    return list(active_drivers.values())
+    return json_response(list(active_drivers.values()))
+
+HISTORY_SORT = [("timestamp", 1), ("_id", 1)]
+
+# Capped below the deviation threshold so off-route excursions survive simplification
+MAX_SIMPLIFY_TOLERANCE = DEVIATION_TOLERANCE / 2
 
 @api_router.get("/location/history/{delivery_id}")
-async def get_location_history(delivery_id: str):
-    """Get location history for a delivery"""
-    history = await db.location_history.find({"delivery_id": delivery_id}).sort("timestamp", 1).to_list(1000)
-    return [serialize_doc(h) for h in history]
+async def get_location_history(delivery_id: str,
+                               limit: int = Query(1000, ge=1, le=10000), cursor: Optional[str] = None,
+                               format: str = "json",
+                               tolerance: Optional[float] = Query(None, gt=0),
+                               resolution: Optional[float] = Query(None, gt=0)):
+    """Get location history for a delivery.
+
+    With `tolerance` (metres) or `resolution` (metres per map pixel) the whole
+    trip is returned simplified instead of paginated.
+    """
+    query = history_store.delivery_filter(delivery_id, history_timeseries)
+    if history_timeseries:
+        transform = lambda h: prepare_doc(history_store.from_timeseries(h))
+    else:
+        transform = prepare_doc
+    if tolerance or resolution:
+        tolerance = round(min(tolerance or resolution, MAX_SIMPLIFY_TOLERANCE), 1)
+        return raw_json_response(await get_simplified_history(delivery_id, query, tolerance, transform))
+    return await list_documents(db.location_history, query, HISTORY_SORT, limit, cursor, format, transform)
+
+async def get_simplified_history(delivery_id: str, query: dict, tolerance: float, transform) -> bytes:
+    """Douglas-Peucker simplified history as encoded JSON, cached once the delivery is completed"""
+    cached = trajectory_cache.get((delivery_id, tolerance))
+    if cached is not None:
+        return cached
+    delivery = await db.deliveries.find_one({"id": delivery_id}, {"status": 1, "end_time": 1})
+    completed = bool(delivery and delivery.get('status') == 'completed')
+    if completed:
+        # The last pings of the trip may still be waiting in the write-behind buffer
+        await history_buffer.flush()
+    history = await db.location_history.find(query).sort(HISTORY_SORT).to_list(None)
+    kept = simplify([h['latitude'] for h in history], [h['longitude'] for h in history], tolerance)
+    trajectory = dumps([transform(history[i]) for i in kept])
+    # Other workers flush their own buffer within one interval of the trip's end
+    end_time = delivery.get('end_time') if completed else None
+    if completed and (end_time is None or datetime.utcnow() - end_time > timedelta(seconds=history_buffer.flush_interval)):
+        trajectory_cache.put((delivery_id, tolerance), trajectory)
+    return trajectory
 
 # ============== ALERTS ==============
 
+ALERT_SORT = [("created_at", -1), ("id", -1)]
+
 @api_router.get("/alerts")
-async def get_alerts(resolved: Optional[bool] = None):
+async def get_alerts(resolved: Optional[bool] = None,
+                     limit: int = Query(100, ge=1, le=1000), cursor: Optional[str] = None,
+                     format: str = "json"):
     query = {}
     if resolved is not None:
         query['is_resolved'] = resolved
-    alerts = await db.alerts.find(query).sort("created_at", -1).to_list(100)
-    return [serialize_doc(a) for a in alerts]
+    return await list_documents(db.alerts, query, ALERT_SORT, limit, cursor, format)
 
 @api_router.post("/alerts/emergency")
 async def create_emergency_alert(data: dict):
@@ -984,49 +1990,73 @@ async def create_emergency_alert(data: dict):
         severity="critical"
     )
     await db.alerts.insert_one(alert.dict())
+    await share_alert_change(dashboard_counters.alert_changed(None, alert.dict()))
     
     # Broadcast to admins
-    await manager.broadcast_to_admins({
+    await realtime.publish(ADMIN_CHANNEL, {
         "type": "emergency",
-        "data": alert.dict()
+        "data": serialize_doc(alert.dict())
     })
     
     return {"success": True, "alert_id": alert.id}
 
 @api_router.put("/alerts/{alert_id}/resolve")
 async def resolve_alert(alert_id: str):
-    result = await db.alerts.update_one(
-        {"id": alert_id},
-        {"$set": {"is_resolved": True, "resolved_at": datetime.utcnow()}}
+    update_data = {"is_resolved": True, "resolved_at": datetime.utcnow()}
+    before = await db.alerts.find_one_and_update(
+        {"id": alert_id}, {"$set": update_data}, return_document=ReturnDocument.BEFORE
     )
+    dashboard = Counter()
+    if before:
+        dashboard = dashboard_counters.alert_changed(before, {**before, **update_data})
+    # The suppressor state lives on the worker holding the driver's socket
+    alert_suppressor.discard(alert_id)
+    await share_alert_change(dashboard, alert_id)
     return {"success": True}
 
 # ============== CAMERAS (Simulated) ==============
 
 @api_router.get("/cameras")
 async def get_cameras():
-    cameras = await db.cameras.find({"is_active": True}).to_list(100)
-    if not cameras:
-        # Insert demo cameras
-        for cam in DEMO_CAMERAS:
-            await db.cameras.insert_one(cam)
-        return DEMO_CAMERAS
+    # Same set as CameraIndex.load, so this sync never shrinks the index
+    cameras = await db.cameras.find({"is_active": True}).to_list(None)
+    camera_index.sync(cameras)
     return [serialize_doc(c) for c in cameras]
 
 @api_router.get("/cameras/nearest")
 async def get_nearest_camera(lat: float, lng: float):
     """Get the nearest camera to a location"""
-    cameras = await get_cameras()
-    nearest = None
-    min_dist = float('inf')
-    
-    for cam in cameras:
-        dist = calculate_distance(lat, lng, cam['location']['lat'], cam['location']['lng'])
-        if dist < min_dist:
-            min_dist = dist
-            nearest = cam
-    
-    return {"camera": nearest, "distance": min_dist}
+    index = await camera_index.ready()
+    nearest = index.nearest(lat, lng)
+    if not nearest:
+        return {"camera": None, "distance": None}
+    camera, distance = nearest[0]
+    return {"camera": camera, "distance": distance}
+
+@api_router.get("/cameras/knearest")
+async def get_k_nearest_cameras(lat: float, lng: float, k: int = 3):
+    """Get the k cameras closest to a location"""
+    index = await camera_index.ready()
+    return {"cameras": [{"camera": c, "distance": d} for c, d in index.nearest(lat, lng, k)]}
+
+@api_router.get("/cameras/within")
+async def get_cameras_within(lat: float, lng: float, radius: float = 500):
+    """Get the cameras within a radius (meters) of a location"""
+    index = await camera_index.ready()
+    return {"cameras": [{"camera": c, "distance": d} for c, d in index.within(lat, lng, radius)]}
+
+@api_router.post("/cameras/nearest/batch")
+async def get_nearest_cameras_batch(query: PointsQuery):
+    """Get the nearest camera for many locations in one call"""
+    index = await camera_index.ready()
+    nearest, distances = index.nearest_many(
+        [p.get('lat', 0) for p in query.points],
+        [p.get('lng', 0) for p in query.points]
+    )
+    return {"results": [
+        {"camera": index.items[i], "distance": float(d)} if i >= 0 else {"camera": None, "distance": None}
+        for i, d in zip(nearest, distances)
+    ]}
 
 # ============== SITE MAP DATA ==============
 
@@ -1109,38 +2139,83 @@ async def get_site_info():
 @api_router.get("/stats/dashboard")
 async def get_dashboard_stats():
     """Get dashboard statistics"""
-    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    
-    total_deliveries = await db.deliveries.count_documents({})
-    today_deliveries = await db.deliveries.count_documents({"created_at": {"$gte": today}})
-    pending_deliveries = await db.deliveries.count_documents({"status": "pending"})
-    in_progress = await db.deliveries.count_documents({"status": "in_progress"})
-    completed_today = await db.deliveries.count_documents({"status": "completed", "end_time": {"$gte": today}})
-    
-    active_alerts = await db.alerts.count_documents({"is_resolved": False})
-    critical_alerts = await db.alerts.count_documents({"is_resolved": False, "severity": "critical"})
-    
+    counts = await dashboard_counters.snapshot(db)
     return {
-        "total_deliveries": total_deliveries,
-        "today_deliveries": today_deliveries,
-        "pending_deliveries": pending_deliveries,
-        "in_progress": in_progress,
-        "completed_today": completed_today,
+        "total_deliveries": counts["total_deliveries"],
+        "today_deliveries": counts["today_deliveries"],
+        "pending_deliveries": counts["pending_deliveries"],
+        "in_progress": counts["in_progress"],
+        "completed_today": counts["completed_today"],
         "active_drivers": len(active_drivers),
-        "active_alerts": active_alerts,
-        "critical_alerts": critical_alerts
+        "active_alerts": counts["active_alerts"],
+        "critical_alerts": counts["critical_alerts"]
+    }
+
+@api_router.get("/stats/runtime")
+async def get_runtime_stats():
+    """Get in-process cache and pipeline counters"""
+    return {
+        "route_cache": route_cache.stats(),
+        "location_history": history_buffer.stats(),
+        "connections": manager.stats(),
+        "driver_sessions": driver_sessions.stats(),
+        "camera_index": camera_index.stats(),
+        "geofences": geofences.stats(),
+        "alerts": alert_suppressor.stats(),
+        "dashboard": dashboard_counters.stats(),
+        "trajectories": trajectory_cache.stats(),
+        "qr": qr_service.stats(),
+        "realtime": realtime.stats()
     }
 
 # ============== WEBSOCKET ==============
 
+async def offer_location(session: DeliverySession, location: LocationUpdate):
+    superseded = session.offer(location)
+    if superseded is not None:
+        await record_location_history(superseded)
+
+async def process_driver_frames(session: DeliverySession):
+    """Run the location pipeline on the newest pending frame of one driver"""
+    while True:
+        location = await session.take()
+        try:
+            await session.ensure(location.delivery_id)
+            route = route_cache.get(session.route_id) if session.route_id else None
+            await process_location(location, session.delivery, route)
+        except Exception as e:
+            logger.error(f"Location processing failed for driver {session.driver_id}: {e}")
+
 @app.websocket("/ws/driver/{driver_id}")
 async def websocket_driver(websocket: WebSocket, driver_id: str):
     await manager.connect_driver(websocket, driver_id)
+    session = driver_sessions.open(driver_id)
+    # Frames are read here and processed by a separate task, so a slow pipeline
+    # never delays reading: superseded positions only go to history
+    processor = asyncio.create_task(process_driver_frames(session))
     try:
         while True:
-            data = await websocket.receive_json()
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                raise WebSocketDisconnect(message.get('code', 1000))
+            if message.get('bytes') is not None:
+                # Compact binary location frame
+                location = decode_location_frame(driver_id, message['bytes'], session.slots)
+                if location is not None:
+                    await offer_location(session, location)
+                continue
+            data = json.loads(message['text'])
             # Handle driver messages (location updates, etc.)
-            if data.get('type') == 'location':
+            if data.get('type') == 'start_trip':
+                delivery_id = data.get('delivery_id', '')
+                await session.load(delivery_id)
+                await websocket.send_json({
+                    "type": "trip_started",
+                    "delivery_id": delivery_id,
+                    "slot": session.slot(delivery_id),
+                    "frame_format": LOCATION_FRAME.format
+                })
+            elif data.get('type') == 'location':
                 location = LocationUpdate(
                     driver_id=driver_id,
                     delivery_id=data.get('delivery_id', ''),
@@ -1149,34 +2224,59 @@ async def websocket_driver(websocket: WebSocket, driver_id: str):
                     speed=data.get('speed', 0),
                     heading=data.get('heading', 0)
                 )
-                await update_location(location)
+                await offer_location(session, location)
     except WebSocketDisconnect:
+        pass
+    finally:
+        # Stop the pipeline first: a ping it is still processing would
+        # otherwise re-register the driver after the cleanup below
+        processor.cancel()
+        try:
+            await processor
+        except asyncio.CancelledError:
+            pass
+        # Also after a handler error, so the driver never stays registered
+        if session.pending is not None:
+            await record_location_history(session.pending)
+        driver_sessions.close(driver_id, session)
         manager.disconnect_driver(driver_id)
         # Remove from active drivers
-        if driver_id in active_drivers:
-            del active_drivers[driver_id]
-        await manager.broadcast_to_admins({
-            "type": "driver_disconnected",
-            "driver_id": driver_id
-        })
+        realtime.remove_driver(driver_id)
+        geofences.forget(driver_id)
+        await close_driver_alerts(driver_id)
+        await realtime.publish(DRIVER_REMOVED, {"driver_id": driver_id})
 
 @app.websocket("/ws/admin")
-async def websocket_admin(websocket: WebSocket):
-    await manager.connect_admin(websocket)
+async def websocket_admin(websocket: WebSocket, protocol: int = 1):
+    """Admin feed; ?protocol=2 selects the snapshot + delta format"""
+    if protocol not in ADMIN_PROTOCOLS:
+        await websocket.close(code=1003)
+        return
+    connection = await manager.connect_admin(websocket, protocol)
     try:
         # Send current active drivers
-        await websocket.send_json({
-            "type": "active_drivers",
-            "data": list(active_drivers.values())
-        })
+        if protocol == 2:
+            connection.enqueue(manager.snapshot())
+        else:
+            connection.enqueue({
+                "type": "active_drivers",
+                "data": list(active_drivers.values())
+            })
         while True:
             data = await websocket.receive_json()
             # Handle admin commands
-            if data.get('type') == 'message_driver':
-                driver_id = data.get('driver_id')
-                await manager.send_to_driver(driver_id, {
-                    "type": "admin_message",
-                    "message": data.get('message')
+            if data.get('type') == 'resync' and protocol == 2:
+                # Client missed a sequence number: queued driver state is superseded,
+                # other frames (emergencies, broadcasts) still have to be delivered
+                connection.discard("delta", "snapshot")
+                connection.enqueue(manager.snapshot())
+            elif data.get('type') == 'message_driver':
+                await realtime.publish(DRIVER_MESSAGE_CHANNEL, {
+                    "driver_id": data.get('driver_id'),
+                    "message": {
+                        "type": "admin_message",
+                        "message": data.get('message')
+                    }
                 })
     except WebSocketDisconnect:
         manager.disconnect_admin(websocket)
@@ -1201,10 +2301,43 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+async def seed_collection(collection, docs: List[dict]) -> int:
+    """Insert the missing `docs` with one bulk_write of upserts keyed on `id`.
+
+    $setOnInsert leaves existing documents untouched, so running it again, or
+    from several workers at once, never duplicates nor overwrites anything; the
+    unique `id` index settles concurrent inserts of the same document.
+    """
+    operations = [UpdateOne({"id": doc['id']}, {"$setOnInsert": doc}, upsert=True) for doc in docs]
+    try:
+        result = await collection.bulk_write(operations, ordered=False)
+        return result.upserted_count
+    except BulkWriteError as e:
+        errors = e.details.get('writeErrors', [])
+        if any(error.get('code') != 11000 for error in errors):
+            raise
+        # Another worker inserted these documents first
+        return e.details.get('nUpserted', 0)
+
+async def seed_demo_data():
+    """Seed the demo routes and cameras into empty collections; runs at startup only"""
+    now = datetime.utcnow()
+    if await db.routes.count_documents({}, limit=1) == 0:
+        seeded = await seed_collection(db.routes, [{**route, "created_at": now} for route in DEMO_ROUTES])
+        logger.info(f"Demo routes initialized ({seeded} inserted)")
+    if await db.cameras.count_documents({}, limit=1) == 0:
+        seeded = await seed_collection(db.cameras, [dict(cam) for cam in DEMO_CAMERAS])
+        logger.info(f"Demo cameras initialized ({seeded} inserted)")
+
 @app.on_event("startup")
 async def startup():
+    manager.start_ticker()
+    qr_service.start()
+    await realtime.start()
+    
     if db is None:
         logger.error("MongoDB not connected. Please check your MONGO_URL in .env file")
         logger.error("You can use MongoDB Atlas (free): https://www.mongodb.com/cloud/atlas")
@@ -1219,20 +2352,28 @@ async def startup():
         logger.error("Please start MongoDB or configure MongoDB Atlas")
         return
     
+    global history_timeseries
+    if history_store.TIMESERIES_ENABLED:
+        try:
+            history_timeseries = await history_store.ensure_timeseries(db)
+            if not history_timeseries:
+                logger.warning("location_history is a regular collection; run migrate_location_history.py to enable time-series storage")
+        except Exception as e:
+            logger.error(f"Time-series setup for location_history failed: {e}")
+    try:
+        failures = await apply_indexes(db, history_timeseries)
+        logger.info("Indexes applied" + (f" ({failures} failed)" if failures else ""))
+    except Exception as e:
+        logger.error(f"Index setup failed: {e}")
+    history_buffer.start(db.location_history)
+    
     # Initialize demo data
     try:
-        routes_count = await db.routes.count_documents({})
-        if routes_count == 0:
-            for route in DEMO_ROUTES:
-                route['created_at'] = datetime.utcnow()
-                await db.routes.insert_one(route)
-            logger.info("Demo routes initialized")
-        
-        cameras_count = await db.cameras.count_documents({})
-        if cameras_count == 0:
-            for cam in DEMO_CAMERAS:
-                await db.cameras.insert_one(cam)
-            logger.info("Demo cameras initialized")
+        await seed_demo_data()
+        await route_cache.load()
+        await camera_index.load()
+        await dashboard_counters.reconcile(db)
+        dashboard_counters.start(db)
         
         # Create admin user if not exists
         admin = await db.users.find_one({"email": "admin@sitetrack.fr"})
@@ -1252,4 +2393,9 @@ async def startup():
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await manager.stop_ticker()
+    qr_service.stop()
+    await realtime.stop()
+    await dashboard_counters.stop()
+    await history_buffer.stop()
     client.close()
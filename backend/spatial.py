@@ -0,0 +1,168 @@
+"""In-memory spatial indexes over geographic points."""
+from collections import defaultdict
+from typing import Callable, Dict, List, Sequence, Tuple
+import math
+
+import numpy as np
+
+from geo import LocalProjection, haversine
+
+DEFAULT_CELL_SIZE = 250  # metres
+
+# Beyond this many grid rings a query scans every point instead
+MAX_RING_SCAN = 32
+
+# Upper bound on the distance matrix built by one batch step
+BATCH_MATRIX_SIZE = 4_000_000
+
+
+class PointIndex:
+    """Uniform grid over items located by (lat, lng).
+
+    Points are projected to metres around their centroid and bucketed in square
+    cells of `cell_size`, so a query only looks at the cells around it.
+    Reported distances are great-circle metres.
+    """
+
+    def __init__(self, items: Sequence, locate: Callable[[object], Tuple[float, float]],
+                 cell_size: float = DEFAULT_CELL_SIZE):
+        self.items = list(items)
+        self.cell_size = cell_size
+        coords = np.array([locate(item) for item in self.items], dtype=np.float64).reshape(-1, 2)
+        self.lats = coords[:, 0]
+        self.lngs = coords[:, 1]
+        if self.items:
+            self.projection = LocalProjection(float(self.lats.mean()), float(self.lngs.mean()))
+        else:
+            self.projection = LocalProjection(0.0, 0.0)
+        self.xy = self.projection.project(self.lats, self.lngs)
+        self.cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        for i, (x, y) in enumerate(self.xy):
+            self.cells[(math.floor(x / cell_size), math.floor(y / cell_size))].append(i)
+        if self.cells:
+            keys = np.array(list(self.cells.keys()))
+            self.cell_min = keys.min(axis=0)
+            self.cell_max = keys.max(axis=0)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        x, y = self.projection.project(lat, lng)
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def _rings_to_cover(self, cx: int, cy: int) -> int:
+        return int(max(abs(cx - self.cell_min[0]), abs(cx - self.cell_max[0]),
+                       abs(cy - self.cell_min[1]), abs(cy - self.cell_max[1])))
+
+    def _ring(self, cx: int, cy: int, r: int) -> List[int]:
+        """Indices of the points in cells at Chebyshev distance r from (cx, cy)"""
+        if r == 0:
+            return list(self.cells.get((cx, cy), ()))
+        found = []
+        for dx in range(-r, r + 1):
+            found.extend(self.cells.get((cx + dx, cy - r), ()))
+            found.extend(self.cells.get((cx + dx, cy + r), ()))
+        for dy in range(-r + 1, r):
+            found.extend(self.cells.get((cx - r, cy + dy), ()))
+            found.extend(self.cells.get((cx + r, cy + dy), ()))
+        return found
+
+    def _result(self, lat: float, lng: float, indices) -> List[Tuple[object, float]]:
+        indices = np.asarray(indices, dtype=np.int64)
+        distances = haversine(lat, lng, self.lats[indices], self.lngs[indices])
+        order = np.argsort(distances, kind="stable")
+        return [(self.items[indices[i]], float(distances[i])) for i in order]
+
+    def nearest(self, lat: float, lng: float, k: int = 1) -> List[Tuple[object, float]]:
+        """The k closest items with their distance, closest first"""
+        k = min(k, len(self.items))
+        if k <= 0:
+            return []
+        cx, cy = self._cell(lat, lng)
+        last_ring = self._rings_to_cover(cx, cy)
+        if last_ring > MAX_RING_SCAN:
+            return self._result(lat, lng, range(len(self.items)))[:k]
+        candidates: List[int] = []
+        query = self.projection.project(lat, lng)
+        for r in range(last_ring + 1):
+            candidates.extend(self._ring(cx, cy, r))
+            if len(candidates) >= k:
+                # Points in unvisited rings are at least r cells away
+                d = np.hypot(*(self.xy[candidates] - query).T)
+                if np.partition(d, k - 1)[k - 1] <= r * self.cell_size:
+                    break
+        return self._result(lat, lng, candidates)[:k]
+
+    def within(self, lat: float, lng: float, radius: float) -> List[Tuple[object, float]]:
+        """Items within `radius` metres, closest first"""
+        if not self.items:
+            return []
+        cx, cy = self._cell(lat, lng)
+        rings = min(math.ceil(radius / self.cell_size), self._rings_to_cover(cx, cy))
+        if rings > MAX_RING_SCAN:
+            candidates = range(len(self.items))
+        else:
+            candidates = [i for r in range(rings + 1) for i in self._ring(cx, cy, r)]
+        return [(item, d) for item, d in self._result(lat, lng, candidates) if d <= radius]
+
+    def nearest_many(self, lats, lngs) -> Tuple[np.ndarray, np.ndarray]:
+        """Index of the nearest item and its distance for every point, vectorized"""
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        lngs = np.atleast_1d(np.asarray(lngs, dtype=np.float64))
+        nearest = np.full(len(lats), -1, dtype=np.int64)
+        distances = np.full(len(lats), np.inf)
+        if not self.items:
+            return nearest, distances
+        query = self.projection.project(lats, lngs)
+        step = max(1, BATCH_MATRIX_SIZE // len(self.items))
+        for start in range(0, len(lats), step):
+            chunk = query[start:start + step]
+            d2 = ((chunk[:, None, :] - self.xy[None, :, :]) ** 2).sum(axis=2)
+            nearest[start:start + step] = d2.argmin(axis=1)
+        distances = haversine(lats, lngs, self.lats[nearest], self.lngs[nearest])
+        return nearest, distances
+
+
+class CircleIndex:
+    """Grid over circular zones: every cell lists the zones that overlap it.
+
+    A point lookup reads a single cell and checks only those candidates.
+    """
+
+    def __init__(self, zones: Sequence, locate: Callable[[object], Tuple[float, float, float]],
+                 cell_size: float = DEFAULT_CELL_SIZE):
+        self.zones = list(zones)
+        self.cell_size = cell_size
+        circles = [locate(zone) for zone in self.zones]
+        if circles:
+            self.projection = LocalProjection(sum(c[0] for c in circles) / len(circles),
+                                              sum(c[1] for c in circles) / len(circles))
+        else:
+            self.projection = LocalProjection(0.0, 0.0)
+        self.circles: List[Tuple[float, float, float]] = []
+        self.cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        for i, (lat, lng, radius) in enumerate(circles):
+            x, y = self._xy(lat, lng)
+            self.circles.append((x, y, radius))
+            for cx in range(math.floor((x - radius) / cell_size), math.floor((x + radius) / cell_size) + 1):
+                for cy in range(math.floor((y - radius) / cell_size), math.floor((y + radius) / cell_size) + 1):
+                    self.cells[(cx, cy)].append(i)
+
+    def __len__(self) -> int:
+        return len(self.zones)
+
+    def _xy(self, lat: float, lng: float) -> Tuple[float, float]:
+        p = self.projection
+        return (lng - p.lng0) * p.kx, (lat - p.lat0) * p.ky
+
+    def containing(self, lat: float, lng: float) -> list:
+        """Zones whose circle contains the point"""
+        x, y = self._xy(lat, lng)
+        candidates = self.cells.get((math.floor(x / self.cell_size), math.floor(y / self.cell_size)), ())
+        found = []
+        for i in candidates:
+            zx, zy, radius = self.circles[i]
+            if (x - zx) ** 2 + (y - zy) ** 2 <= radius ** 2:
+                found.append(self.zones[i])
+        return found
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""Script pour vérifier que chaque requête du serveur utilise un index
+
+Applique le registre d'index (indexes.py) sur une base jetable
+(DB_NAME + "_index_test"), y insère quelques documents, puis lance explain()
+sur chaque forme de requête de QUERY_SHAPES. Recrée ensuite location_history
+en collection time-series pour vérifier TIMESERIES_SHAPES. Échoue si un plan
+contient un COLLSCAN. Nécessite un mongod local (MONGO_URL).
+
+Usage: python test_indexes.py
+"""
+import asyncio
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import history_store
+from indexes import QUERY_SHAPES, TIMESERIES_SHAPES, apply_indexes
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+db_name = os.environ.get('DB_NAME', 'delivery_tracker') + "_index_test"
+
+SAMPLE_SIZE = 500
+
+def sample_docs(collection, n):
+    now = datetime.utcnow()
+    for i in range(n):
+        doc = {
+            "id": str(uuid.uuid4()),
+            "created_at": now - timedelta(minutes=i),
+            "is_active": i % 5 != 0,
+        }
+        if collection == "users":
+            doc["email"] = f"user{i}@sitetrack.fr"
+        elif collection == "deliveries":
+            doc["status"] = ("pending", "in_progress", "completed", "cancelled")[i % 4]
+        elif collection == "delivery_qr":
+            doc["delivery_id"] = doc["id"]
+        elif collection == "alerts":
+            doc["is_resolved"] = i % 3 == 0
+        elif collection == "location_history":
+            doc["delivery_id"] = f"delivery-{i % 20}"
+            doc["timestamp"] = doc["created_at"]
+        yield doc
+
+def stages(plan):
+    """Every stage name in an explain plan tree"""
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            yield plan['stage']
+        for value in plan.values():
+            yield from stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from stages(value)
+
+def winning_plan(explain):
+    """Winning plan of a find, also when explain() wraps it in an aggregation (time-series)"""
+    if isinstance(explain, dict):
+        if 'queryPlanner' in explain:
+            return explain['queryPlanner']['winningPlan']
+        values = explain.values()
+    elif isinstance(explain, list):
+        values = explain
+    else:
+        return None
+    for value in values:
+        plan = winning_plan(value)
+        if plan is not None:
+            return plan
+    return None
+
+async def check_shapes(db, shapes):
+    """Number of shapes whose plan contains a COLLSCAN"""
+    failures = 0
+    print(f"🔍 {len(shapes)} formes de requête")
+    for collection, query, sort in shapes:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = winning_plan(await cursor.explain())
+        used = sorted(set(stages(plan)))
+        label = f"{collection} {query}" + (f" sort {sort}" if sort else "")
+        if 'COLLSCAN' in used:
+            failures += 1
+            print(f"❌ COLLSCAN: {label}")
+        else:
+            print(f"✅ {label} ({', '.join(used)})")
+    return failures
+
+async def run():
+    client = AsyncIOMotorClient(mongo_url, serverSelectionTimeoutMS=10000)
+    db = client[db_name]
+    failures = 0
+    try:
+        await client.drop_database(db_name)
+        for collection in {shape[0] for shape in QUERY_SHAPES}:
+            await db[collection].insert_many(list(sample_docs(collection, SAMPLE_SIZE)))
+        if await apply_indexes(db):
+            print("❌ Certains index n'ont pas pu être créés")
+            return False
+
+        failures += await check_shapes(db, QUERY_SHAPES)
+
+        print("\n📦 location_history en collection time-series")
+        await db[history_store.COLLECTION].drop()
+        await history_store.ensure_timeseries(db)
+        await db[history_store.COLLECTION].insert_many(
+            [history_store.to_timeseries(doc) for doc in sample_docs(history_store.COLLECTION, SAMPLE_SIZE)]
+        )
+        failures += await check_shapes(db, TIMESERIES_SHAPES)
+
+        if failures:
+            print(f"\n❌ {failures} requête(s) sans index : complétez INDEXES dans indexes.py")
+            return False
+        print("\n✅ Toutes les requêtes utilisent un index")
+        return True
+
+    except Exception as e:
+        print(f"❌ Erreur: {e}")
+        return False
+    finally:
+        await client.drop_database(db_name)
+        client.close()
+
+if __name__ == "__main__":
+    result = asyncio.run(run())
+    sys.exit(0 if result else 1)
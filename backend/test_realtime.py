@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""Test d'intégration du partage temps réel entre plusieurs workers uvicorn
+
+Lance le serveur avec plusieurs workers (REALTIME_BACKEND=socket) sur une base
+jetable (DB_NAME + "_realtime_test"), connecte des livreurs et des admins
+répartis entre les workers, puis vérifie que :
+  - chaque admin reçoit la position de chaque livreur, quel que soit son worker ;
+  - /api/location/active renvoie tous les livreurs depuis chaque worker ;
+  - un message admin atteint un livreur connecté à un autre worker ;
+  - la déconnexion d'un livreur est annoncée à tous les admins ;
+  - avec MongoDB : la modification d'un itinéraire et la création d'une
+    livraison sont visibles depuis chaque worker (cache des itinéraires,
+    compteurs du tableau de bord).
+
+Usage: python test_realtime.py [workers] [livreurs]
+"""
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+import websockets
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+db_name = os.environ.get('DB_NAME', 'delivery_tracker') + "_realtime_test"
+
+TIMEOUT = 10
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def get_json(url):
+    with urllib.request.urlopen(url, timeout=TIMEOUT) as response:
+        return json.loads(response.read())
+
+def send_json(method, url, body):
+    request = urllib.request.Request(url, data=json.dumps(body).encode(), method=method,
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=TIMEOUT) as response:
+        return json.loads(response.read())
+
+def agreed(url, check, samples):
+    """True once `samples` consecutive answers (from any worker) pass `check`"""
+    deadline = time.monotonic() + TIMEOUT
+    passed = 0
+    while time.monotonic() < deadline:
+        passed = passed + 1 if check(get_json(url)) else 0
+        if passed >= samples:
+            return True
+    return False
+
+async def mongo_available():
+    client = AsyncIOMotorClient(mongo_url, serverSelectionTimeoutMS=2000)
+    try:
+        await client.admin.command('ping')
+        return True
+    except Exception:
+        return False
+    finally:
+        client.close()
+
+def check_invalidations(base, workers):
+    """Changes made through one worker, read back from all of them"""
+    samples = workers * 20
+    route = send_json("POST", f"{base}/api/routes", {
+        "name": "Itinéraire test", "waypoints": [{"lat": 48.80, "lng": 2.12, "order": 0}],
+        "destination": {"lat": 48.81, "lng": 2.13, "name": "Test"}
+    })
+    # Every worker caches the route before it changes
+    if not agreed(f"{base}/api/routes/{route['id']}", lambda r: r['name'] == "Itinéraire test", samples):
+        print("❌ Itinéraire créé absent d'un worker")
+        return False
+    send_json("PUT", f"{base}/api/routes/{route['id']}", {
+        "name": "Itinéraire modifié", "waypoints": [{"lat": 48.82, "lng": 2.12, "order": 0}],
+        "destination": {"lat": 48.83, "lng": 2.13, "name": "Test"}
+    })
+    if not agreed(f"{base}/api/routes/{route['id']}", lambda r: r['name'] == "Itinéraire modifié", samples):
+        print("❌ Un worker sert encore l'ancien itinéraire")
+        return False
+    print("✅ Modification d'itinéraire visible depuis chaque worker")
+
+    total = get_json(f"{base}/api/stats/dashboard")['total_deliveries']
+    if not agreed(f"{base}/api/stats/dashboard", lambda d: d['total_deliveries'] == total, samples):
+        print("❌ Compteurs différents selon le worker avant la création")
+        return False
+    send_json("POST", f"{base}/api/deliveries", {"route_id": route['id']})
+    if not agreed(f"{base}/api/stats/dashboard", lambda d: d['total_deliveries'] == total + 1, samples):
+        print("❌ Un worker ne compte pas la nouvelle livraison")
+        return False
+    print("✅ Compteurs du tableau de bord identiques sur chaque worker")
+    return True
+
+def start_server(port, workers, socket_path):
+    env = dict(os.environ, DB_NAME=db_name, REALTIME_BACKEND="socket",
+               REALTIME_SOCKET=socket_path, ADMIN_BROADCAST_HZ="0")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--workers", str(workers)],
+        cwd=ROOT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+def wait_for_workers(base, workers):
+    """Runtime stats of each worker (by pid), once all of them answer"""
+    seen = {}
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            stats = get_json(f"{base}/api/stats/runtime")
+            seen[stats['realtime']['pid']] = stats
+            if len(seen) >= workers and all(s['realtime']['role'] != 'disconnected' for s in seen.values()):
+                return seen
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{len(seen)}/{workers} workers prêts après 60 s")
+
+def connections_by_worker(base, workers):
+    """(drivers, admins) connected to each worker, sampled from fresh HTTP connections"""
+    counts = {}
+    for _ in range(workers * 20):
+        stats = get_json(f"{base}/api/stats/runtime")
+        counts[stats['realtime']['pid']] = (stats['connections']['drivers'], len(stats['connections']['admins']))
+    return counts
+
+async def receive_until(ws, done, frames):
+    """Collect frames from `ws` until done(frames) is true"""
+    while not done(frames):
+        frames.append(json.loads(await ws.recv()))
+
+async def run(workers, drivers_count):
+    socket_path = os.path.join(tempfile.mkdtemp(), "realtime.sock")
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    ws_base = f"ws://127.0.0.1:{port}"
+    server = start_server(port, workers, socket_path)
+    driver_ids = [f"test-driver-{i}" for i in range(drivers_count)]
+    try:
+        print(f"🚀 {workers} workers sur le port {port}")
+        ready = await asyncio.to_thread(wait_for_workers, base, workers)
+        roles = sorted(s['realtime']['role'] for s in ready.values())
+        print(f"✅ Workers prêts : {', '.join(roles)}")
+
+        admins = [await websockets.connect(f"{ws_base}/ws/admin") for _ in range(drivers_count)]
+        drivers = {d: await websockets.connect(f"{ws_base}/ws/driver/{d}") for d in driver_ids}
+        counts = await asyncio.to_thread(connections_by_worker, base, workers)
+        print(f"📊 (livreurs, admins) par worker : {list(counts.values())}")
+        if sum(1 for d, a in counts.values() if d or a) < 2:
+            print("❌ Toutes les connexions sont sur le même worker : test non concluant")
+            return False
+
+        # 1. Positions
+        for i, (driver_id, ws) in enumerate(drivers.items()):
+            await ws.send(json.dumps({"type": "location", "delivery_id": "", "latitude": 0.001 * i,
+                                      "longitude": 0.0, "speed": 10, "heading": 0}))
+        frames = [[] for _ in admins]
+        located = lambda f: {m['data']['driver_id'] for m in f if m.get('type') == 'location_update'} >= set(driver_ids)
+        await asyncio.wait_for(asyncio.gather(*(receive_until(ws, located, f) for ws, f in zip(admins, frames))), TIMEOUT)
+        print(f"✅ {len(admins)} admins ont reçu la position des {len(drivers)} livreurs")
+
+        # 2. État partagé
+        for _ in range(workers * 5):
+            active = await asyncio.to_thread(get_json, f"{base}/api/location/active")
+            missing = set(driver_ids) - {d['driver_id'] for d in active}
+            if missing:
+                print(f"❌ /api/location/active incomplet, manquants : {sorted(missing)}")
+                return False
+        print("✅ /api/location/active complet sur chaque worker")
+
+        # 3. Message admin -> livreur
+        for driver_id in driver_ids:
+            await admins[0].send(json.dumps({"type": "message_driver", "driver_id": driver_id, "message": "test"}))
+        messaged = lambda f: any(m.get('type') == 'admin_message' for m in f)
+        await asyncio.wait_for(asyncio.gather(*(receive_until(ws, messaged, []) for ws in drivers.values())), TIMEOUT)
+        print(f"✅ Message admin reçu par les {len(drivers)} livreurs")
+
+        # 4. Déconnexions
+        for ws in drivers.values():
+            await ws.close()
+        frames = [[] for _ in admins]
+        removed = lambda f: {m.get('driver_id') for m in f if m.get('type') == 'driver_disconnected'} >= set(driver_ids)
+        await asyncio.wait_for(asyncio.gather(*(receive_until(ws, removed, f) for ws, f in zip(admins, frames))), TIMEOUT)
+        active = await asyncio.to_thread(get_json, f"{base}/api/location/active")
+        if any(d['driver_id'] in driver_ids for d in active):
+            print("❌ Des livreurs déconnectés sont encore actifs")
+            return False
+        print("✅ Déconnexions annoncées à tous les admins")
+
+        # 5. Invalidations (nécessite MongoDB)
+        if await mongo_available():
+            if not await asyncio.to_thread(check_invalidations, base, workers):
+                return False
+        else:
+            print("⚠️  MongoDB indisponible : invalidations entre workers non testées")
+
+        for ws in admins:
+            await ws.close()
+        print("\n✅ État et diffusion partagés entre les workers")
+        return True
+
+    except (asyncio.TimeoutError, RuntimeError, OSError) as e:
+        print(f"❌ Erreur: {e!r}")
+        return False
+    finally:
+        server.terminate()
+        server.wait(timeout=TIMEOUT)
+        client = AsyncIOMotorClient(mongo_url, serverSelectionTimeoutMS=2000)
+        try:
+            await client.drop_database(db_name)
+        except Exception:
+            pass
+        client.close()
+
+if __name__ == "__main__":
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    drivers_count = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+    result = asyncio.run(run(workers, drivers_count))
+    sys.exit(0 if result else 1)
@@ -0,0 +1,122 @@
+"""Write-behind buffering for high-volume MongoDB inserts."""
+from collections import deque
+from typing import Optional
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "block")
+
+
+class WriteBehindBuffer:
+    """Queue documents in memory and write them with insert_many in the background.
+
+    A batch is flushed as soon as `batch_size` documents are pending or every
+    `flush_interval` seconds, whichever comes first. At most `max_pending`
+    documents are held; beyond that `overflow` decides whether the oldest or
+    the newest document is dropped, or whether put() waits for a flush.
+    """
+
+    def __init__(self, name: str, batch_size: int = 500, flush_interval: float = 1.0,
+                 max_pending: int = 50000, overflow: str = "drop_oldest"):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.name = name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.overflow = overflow
+        self.collection = None
+        self.pending: deque = deque()
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._lock = asyncio.Lock()
+        # Metrics
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    def start(self, collection):
+        self.collection = collection
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background writer and flush everything still pending"""
+        self._closing = True
+        self._ready.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def put(self, doc: dict):
+        if len(self.pending) >= self.max_pending:
+            if self.overflow == "drop_newest":
+                self.dropped += 1
+                return
+            if self.overflow == "drop_oldest":
+                self.pending.popleft()
+                self.dropped += 1
+            else:
+                while len(self.pending) >= self.max_pending:
+                    self._ready.set()
+                    self._space.clear()
+                    await self._space.wait()
+        self.pending.append(doc)
+        self.enqueued += 1
+        if len(self.pending) >= self.batch_size:
+            self._ready.set()
+
+    async def flush(self):
+        if self.collection is None:
+            return
+        async with self._lock:
+            while self.pending:
+                batch = [self.pending.popleft() for _ in range(min(self.batch_size, len(self.pending)))]
+                self._space.set()
+                start = time.perf_counter()
+                try:
+                    await self.collection.insert_many(batch, ordered=False)
+                    self.written += len(batch)
+                except Exception as e:
+                    self.failed += len(batch)
+                    logger.error(f"Write-behind flush to {self.name} failed ({len(batch)} documents): {e}")
+                elapsed = (time.perf_counter() - start) * 1000
+                self.flushes += 1
+                self.last_flush_ms = elapsed
+                self.max_flush_ms = max(self.max_flush_ms, elapsed)
+                self.total_flush_ms += elapsed
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._ready.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._ready.clear()
+            await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "depth": len(self.pending),
+            "max_pending": self.max_pending,
+            "overflow": self.overflow,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "flushes": self.flushes,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "max_flush_ms": round(self.max_flush_ms, 3),
+            "avg_flush_ms": round(self.total_flush_ms / self.flushes, 3) if self.flushes else 0.0,
+        }
@@ -79,6 +79,19 @@ export default function AdminDeliveries() {
     }
   };
 
+  // Delivery lists come without the QR image; it is loaded when the modal opens
+  const openQRModal = async (delivery: any) => {
+    setSelectedDelivery(delivery);
+    setShowQRModal(true);
+    if (delivery.qr_code) return;
+    try {
+      const response = await api.get(`/qr/generate/${delivery.id}`);
+      setSelectedDelivery({ ...delivery, qr_code: response.data.qr_code });
+    } catch (error) {
+      console.error('Error loading QR code:', error);
+    }
+  };
+
   const getStatusColor = (status: string) => {
     switch (status) {
       case 'pending': return '#ff9500';
@@ -173,10 +186,7 @@ export default function AdminDeliveries() {
             <TouchableOpacity
               key={delivery.id}
               style={styles.deliveryCard}
-              onPress={() => {
-                setSelectedDelivery(delivery);
-                setShowQRModal(true);
-              }}
+              onPress={() => openQRModal(delivery)}
             >
               <View style={styles.deliveryHeader}>
                 <View style={styles.deliveryInfo}>
@@ -189,10 +199,7 @@ export default function AdminDeliveries() {
                 </View>
                 <TouchableOpacity
                   style={styles.qrButton}
-                  onPress={() => {
-                    setSelectedDelivery(delivery);
-                    setShowQRModal(true);
-                  }}
+                  onPress={() => openQRModal(delivery)}
                 >
                   <Ionicons name="qr-code" size={24} color="#00d4ff" />
                 </TouchableOpacity>